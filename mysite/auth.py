@@ -0,0 +1,124 @@
+"""Cache the authenticated user, so a page view skips the auth_user query.
+
+With settings.AUTH_USER_CACHE on, CachedAuthenticationMiddleware reads the
+user of the session from the cache and only falls back to the database on
+a miss. The session is still verified against the cached password hash on
+every request.
+
+Entries are kept per user rather than per session, so saving or deleting
+a user, logging out and changing a password drop one key. Group and
+permission changes can touch many users at once: they bump a version
+stored next to the entries instead, which makes every cached user stale.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import Group
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+VERSION_KEY = 'auth:user:version'
+
+
+def get_cache():
+    """Return the cache holding the users."""
+    return caches[settings.AUTH_USER_CACHE_BACKEND]
+
+
+def user_cache_key(user_id):
+    """Return the cache key of the user with that id."""
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop the cached copy of a user."""
+    get_cache().delete(user_cache_key(user_id))
+
+
+def forget_all_users():
+    """Make every cached user stale."""
+    cache = get_cache()
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted between add() and incr().
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def get_cached_user(request):
+    """Return the user of the request session, from the cache when possible.
+
+    Same as django.contrib.auth.get_user(), which is used on a miss or when
+    the session does not match the cached password hash.
+
+    Returns:
+        User : the user, or an AnonymousUser
+    """
+    session = request.session
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+    cache = get_cache()
+    key = user_cache_key(user_id)
+    values = cache.get_many([key, VERSION_KEY])
+    version = values.get(VERSION_KEY, 0)
+    cached = values.get(key)
+    if cached is not None and cached[0] == version:
+        user = cached[1]
+        session_hash = session.get(auth.HASH_SESSION_KEY)
+        if session_hash and auth.constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return user
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, (version, user), settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware reading request.user from the cache when settings.AUTH_USER_CACHE is on."""
+
+    def process_request(self, request):
+        if not settings.AUTH_USER_CACHE:
+            return super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_request_user(request))
+
+
+def get_request_user(request):
+    """Return the cached user of the request, loading it once per request."""
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+User = auth.get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed_callback(sender, instance, **kwargs):
+    """Drop the cached user when it is saved, e.g. after a password change, or deleted."""
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def user_logged_out_callback(sender, request, user, **kwargs):
+    """Drop the cached user on logout."""
+    if user is not None:
+        forget_user(user.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed_callback(sender, action, **kwargs):
+    """Make every cached user stale when group memberships or permissions change."""
+    if action.startswith('post_'):
+        forget_all_users()
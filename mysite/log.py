@@ -0,0 +1,100 @@
+"""Structured, non-blocking logging used by settings.LOGGING.
+
+Records are tagged with the current request in the calling thread, then put
+on a queue; a background listener thread formats them as JSON lines and
+writes them, so slow log I/O never runs on the request thread.
+"""
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+current_request = contextvars.ContextVar('current_request', default=None)
+
+# Attributes every LogRecord has; anything else came from extra=.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class RequestContextFilter(logging.Filter):
+    """Add the request id and user of the current request to each record.
+
+    The user is only read if the request already loaded it, so logging
+    never runs a query.
+    """
+
+    def filter(self, record):
+        request = current_request.get()
+        if request is not None:
+            record.request_id = getattr(request, 'id', None)
+            user = getattr(request, '_cached_user', None)
+            if user is not None and user.is_authenticated:
+                record.user = user.get_username()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a rate fraction of the records logged with extra={'sample': True}.
+
+    Args:
+        rate : fraction of the sampled records to keep, between 0 and 1
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sample', False) and record.levelno <= logging.INFO:
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with their extra fields."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES and key != 'sample'
+        )
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """Queue records and write them with handlers in a background thread.
+
+    Args:
+        handlers : the handlers writing the records, e.g. 'cfg://handlers.console'
+        maxsize : records kept while the listener catches up, 0 for no limit
+    """
+
+    def __init__(self, handlers, maxsize=0):
+        super().__init__(queue.Queue(maxsize))
+        self.listener = QueueListener(
+            self.queue, *[handlers[index] for index in range(len(handlers))], respect_handler_level=True
+        )
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        """Keep the record as is, the listener's handlers format it."""
+        return record
+
+    def enqueue(self, record):
+        """Queue the record, dropping it if the queue is full rather than waiting."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
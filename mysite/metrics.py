@@ -0,0 +1,194 @@
+"""Per-request timings: Server-Timing headers and Prometheus histograms.
+
+MetricsMiddleware measures the total time, the SQL query count and time
+(with a database execute wrapper) and the template render time (with the
+TimedDjangoTemplates backend) of each request. It sends them back in a
+Server-Timing header and adds them to in-process histograms labelled with
+the URL name, served at /metrics in the Prometheus text format.
+
+The histograms are per process: scrape every worker, or sum them.
+"""
+import contextvars
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+from polls.cache import results_cache_stats
+
+current_timing = contextvars.ContextVar('current_timing', default=None)
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class RequestTiming:
+    """Timings collected during one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing the queries."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+
+
+class TimedTemplate(Template):
+    """Template adding its render time to the current request timing."""
+
+    def render(self, context=None, request=None):
+        timing = current_timing.get()
+        if timing is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.template += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates measure their render time.
+
+    Only the templates loaded through the backend are timed, so an
+    {% include %} is counted once, in its parent's time.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class Histogram:
+    """Prometheus histogram with one series per view.
+
+    Args:
+        name : the metric name
+        help_text : the metric description
+        buckets : the upper bounds of the buckets
+    """
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        """Add one value to the series of view."""
+        with self.lock:
+            counts, total, count = self.series.get(view, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.series[view] = (counts, total + value, count + 1)
+
+    def collect(self):
+        """Return the Prometheus text lines of the histogram."""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {view: (list(counts), total, count) for view, (counts, total, count) in self.series.items()}
+        for view, (counts, total, count) in sorted(series.items()):
+            label = f'view="{view}"'
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to build the response.', SECONDS_BUCKETS)
+SQL_QUERIES = Histogram('http_request_sql_queries', 'SQL queries run by a request.', QUERY_BUCKETS)
+SQL_SECONDS = Histogram('http_request_sql_seconds', 'Time spent in SQL queries by a request.', SECONDS_BUCKETS)
+TEMPLATE_SECONDS = Histogram('http_request_template_seconds', 'Time spent rendering templates.', SECONDS_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, TEMPLATE_SECONDS)
+
+
+class MetricsMiddleware:
+    """Measure each request, send a Server-Timing header and record the histograms.
+
+    Requests that do not resolve to a URL name are recorded as 'unresolved',
+    so the number of series stays bounded. Under ASGI it runs in the event
+    loop; the queries of async views, run in sync_to_async threads on their
+    own connections, are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.record(request, response, timing, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        """Async version of __call__(), setting the request timing in the same coroutine."""
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.record(request, response, timing, time.perf_counter() - start)
+
+    def record(self, request, response, timing, total):
+        """Add the timings of the request to the histograms and the Server-Timing header."""
+        match = request.resolver_match
+        view = match.view_name if match and match.url_name else 'unresolved'
+        REQUEST_SECONDS.observe(view, total)
+        SQL_QUERIES.observe(view, timing.queries)
+        SQL_SECONDS.observe(view, timing.sql)
+        TEMPLATE_SECONDS.observe(view, timing.template)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timing.sql * 1000:.1f};desc="{timing.queries} queries"',
+            f'tpl;dur={timing.template * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        return response
+
+
+def metrics(request):
+    """View of the histograms and cache counters in the Prometheus text format, for staff only."""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+    for name, value in results_cache_stats().items():
+        lines.append(f'# TYPE polls_results_cache_{name}_total counter')
+        lines.append(f'polls_results_cache_{name}_total {value}')
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
@@ -0,0 +1,61 @@
+"""Middleware for mysite."""
+import logging
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .log import current_request
+
+logger = logging.getLogger('mysite.request')
+
+
+class RequestLogMiddleware:
+    """Give each request an id, expose it to log records and log the latency.
+
+    The id comes from the X-Request-ID header when a proxy set one, and is
+    sent back in the response. The completion record is sampled.
+
+    Under ASGI it runs in the event loop, so async views are not adapted
+    to sync because of it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request.id = request.META.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex
+        token = current_request.set(request)
+        start = time.perf_counter()
+        try:
+            return self.log_response(request, self.get_response(request), start)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        """Async version of __call__(), setting the request context in the same coroutine."""
+        request.id = request.META.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex
+        token = current_request.set(request)
+        start = time.perf_counter()
+        try:
+            return self.log_response(request, await self.get_response(request), start)
+        finally:
+            current_request.reset(token)
+
+    def log_response(self, request, response, start):
+        """Send the request id back and log the completion of the request."""
+        response['X-Request-ID'] = request.id
+        logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'status': response.status_code,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+            'sample': True,
+        })
+        return response
@@ -0,0 +1,142 @@
+"""Send reads to replica databases and writes to the primary.
+
+settings.DATABASE_REPLICAS lists the replica aliases; without any, every
+query goes to 'default' as before. The replicas are copies of the primary
+made by `python manage.py syncreplicas`, so they lag behind it:
+
+* only reads made while PrimaryPinMiddleware serves a request go to the
+  replicas: management commands and background threads read from the
+  primary;
+* requests with an unsafe method, and queries inside a transaction on the
+  primary, read from the primary;
+* after a request that wrote, PrimaryPinMiddleware sets a cookie pinning
+  the client's reads to the primary for settings.DATABASE_PIN_SECONDS, so
+  users read their own writes. Keep it above the replication lag.
+"""
+import contextvars
+import random
+import sqlite3
+import time
+from contextlib import closing
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+current_pin = contextvars.ContextVar('current_pin', default=None)
+
+
+class PrimaryPin:
+    """Routing state of the current request.
+
+    Args:
+        pinned : true if the reads of the request go to the primary
+    """
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    """Read from a random replica during requests not pinned to the primary; write to the primary."""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from the database of the instance.
+            return instance._state.db
+        pin = current_pin.get()
+        if pin is None or pin.pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin = current_pin.get()
+        if pin is not None:
+            pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their tables from the copy of the primary.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class PrimaryPinMiddleware:
+    """Pin the reads of unsafe requests, and of clients that just wrote, to the primary.
+
+    Under ASGI it runs in the event loop. The sync_to_async calls of async
+    views copy the context, so their queries see the pin of the request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        pin = PrimaryPin(request.method not in SAFE_METHODS or self.pinned_by_cookie(request))
+        token = current_pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_pin.reset(token)
+        return self.set_pin_cookie(pin, response)
+
+    async def __acall__(self, request):
+        """Async version of __call__(), setting and resetting the pin in the same coroutine."""
+        pin = PrimaryPin(request.method not in SAFE_METHODS or self.pinned_by_cookie(request))
+        token = current_pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_pin.reset(token)
+        return self.set_pin_cookie(pin, response)
+
+    def set_pin_cookie(self, pin, response):
+        """Pin the client to the primary if the request wrote."""
+        if pin.wrote and settings.DATABASE_REPLICAS:
+            seconds = settings.DATABASE_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True,
+                                samesite='Lax')
+        return response
+
+    def pinned_by_cookie(self, request):
+        """Return true if the pin cookie of the request has not expired."""
+        try:
+            return float(request.COOKIES[PIN_COOKIE]) > time.time()
+        except (KeyError, ValueError):
+            return False
+
+
+def sync_replica(alias, source=DEFAULT_DB_ALIAS):
+    """Copy the source SQLite database over the replica alias with the SQLite backup API.
+
+    The copy runs in one step: readers of the replica wait for it (up to
+    the busy_timeout) and then see the new copy.
+    """
+    connection = connections[source]
+    connection.ensure_connection()
+    connections[alias].close()
+    with closing(sqlite3.connect(connections[alias].settings_dict['NAME'])) as replica:
+        connection.connection.backup(replica)
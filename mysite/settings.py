@@ -27,6 +27,9 @@ SECRET_KEY = env('SECRET_KEY')
 DEBUG = bool(env('DEBUG', default='False'))
 TIME_ZONE = env('TIME_ZONE', default='UTC')
 STATIC_URL = env('STATIC_URL', default='/static/')
+POLLS_INDEX_PAGE_SIZE = env.int('POLLS_INDEX_PAGE_SIZE', default=20)
+# Serve the polls pages with the async views of polls/async_views.py (for ASGI).
+POLLS_ASYNC_VIEWS = env.bool('POLLS_ASYNC_VIEWS', default=False)
 
 ALLOWED_HOSTS = []
 
@@ -44,11 +47,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mysite.middleware.RequestLogMiddleware',
+    'mysite.metrics.MetricsMiddleware',
+    'mysite.routers.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware that can read the user from the cache.
+    'mysite.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,7 +64,8 @@ ROOT_URLCONF = 'mysite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also times the rendering, see mysite/metrics.py.
+        'BACKEND': 'mysite.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -66,6 +74,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'polls.context_processors.fragments',
             ],
         },
     },
@@ -86,6 +95,113 @@ DATABASES = {
     }
 }
 
+# PRAGMAs run on every new SQLite connection (see polls/signals.py).
+SQLITE_PRAGMAS = {}
+
+# DATABASE_PROFILE=production keeps connections open between requests and
+# tunes SQLite for concurrent voters: WAL lets readers run while a vote is
+# written and busy_timeout makes writers wait for the lock instead of
+# failing with "database is locked".
+DATABASE_PROFILE = env('DATABASE_PROFILE', default='development')
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        # Connections that raised errors are closed at the end of the request.
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=600),
+    })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),
+        'cache_size': -env.int('SQLITE_CACHE_KIB', default=64 * 1024),
+        'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT_MS', default=5000),
+        'temp_store': 'MEMORY',
+    }
+
+# Read replicas, see mysite/routers.py. SQLITE_REPLICAS=N adds the aliases
+# replica1..N, copies of db.sqlite3 made by `python manage.py syncreplicas`.
+# Reads go to a random replica and writes to default; a client that wrote
+# reads from default for DATABASE_PIN_SECONDS, which must exceed the lag.
+DATABASE_ROUTERS = ['polls.shards.VoteShardRouter', 'mysite.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+for index in range(1, env.int('SQLITE_REPLICAS', default=0) + 1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db.replica{index}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_PIN_SECONDS = env.int('DATABASE_PIN_SECONDS', default=10)
+
+# Vote shards, see polls/shards.py. SQLITE_VOTE_SHARDS=N adds the aliases
+# votes0..N-1 (db.votes0.sqlite3, ...) holding the votes, tallies and results
+# version of the questions whose id modulo N is their number. Create their
+# tables with `python manage.py migrate --database votes0` and so on.
+POLLS_VOTE_SHARDS = []
+for index in range(env.int('SQLITE_VOTE_SHARDS', default=0)):
+    DATABASES[f'votes{index}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db.votes{index}.sqlite3',
+    }
+    POLLS_VOTE_SHARDS.append(f'votes{index}')
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# e.g. CACHE_URL=filecache:///var/tmp/ku-polls
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+POLLS_RESULTS_CACHE = 'default'
+POLLS_RESULTS_CACHE_TIMEOUT = env.int('POLLS_RESULTS_CACHE_TIMEOUT', default=3600)
+
+# {% cache %} fragments of the polls pages, keyed on a content version bumped
+# when a question or choice changes. 0 renders them on every request.
+POLLS_FRAGMENT_CACHE_TIMEOUT = env.int('POLLS_FRAGMENT_CACHE_TIMEOUT', default=600)
+
+# Keep compiled templates in memory in production. Django only does it on
+# its own when DEBUG is off.
+if env.bool('TEMPLATE_CACHE', default=DATABASE_PROFILE == 'production'):
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Live results stream (Server-Sent Events), see polls/live.py.
+POLLS_STREAM_POLL_INTERVAL = env.float('POLLS_STREAM_POLL_INTERVAL', default=1.0)
+POLLS_STREAM_HEARTBEAT = env.float('POLLS_STREAM_HEARTBEAT', default=15.0)
+POLLS_STREAM_MAX_SECONDS = env.float('POLLS_STREAM_MAX_SECONDS', default=300.0)
+POLLS_STREAM_MAX_CLIENTS = env.int('POLLS_STREAM_MAX_CLIENTS', default=50)
+
+# Write-behind votes: buffer votes in a local file and write them in batches.
+# Drain the buffer with `python manage.py flushvotes`.
+POLLS_VOTE_WRITE_BEHIND = env.bool('POLLS_VOTE_WRITE_BEHIND', default=False)
+POLLS_VOTE_BUFFER_PATH = env('POLLS_VOTE_BUFFER_PATH', default=str(BASE_DIR / 'vote_buffer.jsonl'))
+POLLS_VOTE_BUFFER_SIZE = env.int('POLLS_VOTE_BUFFER_SIZE', default=500)
+POLLS_VOTE_BUFFER_INTERVAL = env.float('POLLS_VOTE_BUFFER_INTERVAL', default=1.0)
+
+
+# Login throttling, see mysite/throttle.py: after LIMIT failed logins in
+# WINDOW seconds from one IP or for one username, logins are refused
+# without hashing the password.
+AUTHENTICATION_BACKENDS = ['mysite.throttle.ThrottledModelBackend']
+LOGIN_THROTTLE = env.bool('LOGIN_THROTTLE', default=True)
+LOGIN_THROTTLE_CACHE = 'default'
+LOGIN_THROTTLE_WINDOW = env.int('LOGIN_THROTTLE_WINDOW', default=300)
+LOGIN_THROTTLE_IP_LIMIT = env.int('LOGIN_THROTTLE_IP_LIMIT', default=30)
+LOGIN_THROTTLE_USERNAME_LIMIT = env.int('LOGIN_THROTTLE_USERNAME_LIMIT', default=5)
+
+# Cache the user of a session for AUTH_USER_CACHE_TIMEOUT seconds, see
+# mysite/auth.py, so page views skip the auth_user query.
+AUTH_USER_CACHE = env.bool('AUTH_USER_CACHE', default=False)
+AUTH_USER_CACHE_BACKEND = 'default'
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -121,25 +237,56 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
-# LOGGING = {
-#     'version': 1,
-#     'disable_existing_loggers': False,
-#     'formatters': {
-#         'timestamp': {
-#             'format': '[{asctime}] {levelname} {message}',
-#             'datefmt': '%d/%b/%Y %H:%M:%S',
-#             'style': '{',
-#         },
-#     },
-#     'handlers': {
-#         'console': {
-#             'class': 'logging.StreamHandler',
-#             'formatter': 'timestamp'
-#         },
-#     },
-#     'loggers': {
-#         'django': {
-#             'handlers': ['console'],
-#         },
-#     },
-# }
+# Logging
+# https://docs.djangoproject.com/en/3.1/topics/logging/
+# JSON lines on stderr, written by a background thread (see mysite/log.py).
+# LOG_SAMPLE_RATE keeps that fraction of the high-volume info records
+# (request completions and votes); warnings and errors are always kept.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'mysite.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'request_context': {
+            '()': 'mysite.log.RequestContextFilter',
+        },
+        'sampling': {
+            '()': 'mysite.log.SamplingFilter',
+            'rate': env.float('LOG_SAMPLE_RATE', default=1.0),
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+        'queue': {
+            '()': 'mysite.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console'],
+            'maxsize': env.int('LOG_QUEUE_SIZE', default=10000),
+            'filters': ['request_context', 'sampling'],
+        },
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['queue'],
+            'level': env('DJANGO_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        'mysite': {
+            'handlers': ['queue'],
+            'level': env('LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        'polls': {
+            'handlers': ['queue'],
+            'level': env('LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
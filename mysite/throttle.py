@@ -0,0 +1,121 @@
+"""Login throttling: stop password guessing before the password is hashed.
+
+Failed logins are counted per client IP and per username in sliding
+windows held in the cache. ThrottledModelBackend refuses to authenticate
+once either count reaches its limit, so an attacker costs a cache lookup
+instead of a full PBKDF2 hash per attempt.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+
+
+class SlidingWindow:
+    """Approximate count of events in the last window seconds.
+
+    The count of the previous fixed window is weighted by the part of it
+    still inside the sliding window, so two cache keys are enough.
+
+    Args:
+        cache : the cache holding the counters
+        prefix : the prefix of the cache keys
+        window : the window length in seconds
+    """
+
+    def __init__(self, cache, prefix, window):
+        self.cache = cache
+        self.prefix = prefix
+        self.window = window
+
+    def keys(self, ident, now):
+        """Return the keys of the current and previous fixed windows."""
+        index = int(now // self.window)
+        return f'{self.prefix}:{ident}:{index}', f'{self.prefix}:{ident}:{index - 1}'
+
+    def count(self, ident, now=None):
+        """Return the number of events of ident in the sliding window."""
+        now = time.time() if now is None else now
+        current, previous = self.keys(ident, now)
+        counts = self.cache.get_many([current, previous])
+        overlap = 1 - (now % self.window) / self.window
+        return counts.get(current, 0) + counts.get(previous, 0) * overlap
+
+    def hit(self, ident, now=None):
+        """Count one event of ident."""
+        current, _ = self.keys(ident, time.time() if now is None else now)
+        self.cache.add(current, 0, timeout=2 * self.window)
+        try:
+            self.cache.incr(current)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.set(current, 1, timeout=2 * self.window)
+
+    def reset(self, ident, now=None):
+        """Forget the events of ident."""
+        self.cache.delete_many(self.keys(ident, time.time() if now is None else now))
+
+
+def client_ip(request):
+    """Return the IP address of the client, or None without a request."""
+    return request.META.get('REMOTE_ADDR') if request is not None else None
+
+
+def username_key(username):
+    """Return a cache-safe key of the username."""
+    return hashlib.sha256(str(username).lower().encode()).hexdigest()
+
+
+class LoginThrottle:
+    """Failed login counters per IP and per username, configured by settings.LOGIN_THROTTLE_*."""
+
+    def __init__(self):
+        cache = caches[settings.LOGIN_THROTTLE_CACHE]
+        self.ip_window = SlidingWindow(cache, 'login:ip', settings.LOGIN_THROTTLE_WINDOW)
+        self.username_window = SlidingWindow(cache, 'login:user', settings.LOGIN_THROTTLE_WINDOW)
+
+    def counters(self, request, username):
+        """Return the failed logins of the client IP and the username in the window."""
+        ip = client_ip(request)
+        return {
+            'ip_failures': round(self.ip_window.count(ip), 1) if ip else 0,
+            'username_failures': round(self.username_window.count(username_key(username)), 1),
+        }
+
+    def is_throttled(self, request, username):
+        """Return true if the IP or the username reached its limit."""
+        counters = self.counters(request, username)
+        return (counters['ip_failures'] >= settings.LOGIN_THROTTLE_IP_LIMIT
+                or counters['username_failures'] >= settings.LOGIN_THROTTLE_USERNAME_LIMIT)
+
+    def record_failure(self, request, username):
+        """Count a failed login and return the new counters."""
+        ip = client_ip(request)
+        if ip:
+            self.ip_window.hit(ip)
+        self.username_window.hit(username_key(username))
+        return self.counters(request, username)
+
+    def reset(self, username):
+        """Forget the failures of the username after a successful login."""
+        self.username_window.reset(username_key(username))
+
+
+class ThrottledModelBackend(ModelBackend):
+    """ModelBackend that refuses throttled logins before checking the password.
+
+    Raising PermissionDenied stops django.contrib.auth.authenticate() from
+    trying other backends and sends user_login_failed with the request
+    marked as throttled.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if settings.LOGIN_THROTTLE and username is not None:
+            if LoginThrottle().is_throttled(request, username):
+                if request is not None:
+                    request.login_throttled = True
+                raise PermissionDenied
+        return super().authenticate(request, username=username, password=password, **kwargs)
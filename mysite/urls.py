@@ -13,17 +13,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
-from polls import views
+from polls import async_views, views
 from mysite import views as sv
+from mysite.metrics import metrics
 
 urlpatterns = [
     # writed new mysite/views.py file
     # path('', views.index, name="main_index"),
-    path('', views.IndexView.as_view(), name="main_index"),
+    path('', (async_views if settings.POLLS_ASYNC_VIEWS else views).index, name="main_index"),
     path('polls/', include('polls.urls')),
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     path('signup/', sv.signup, name='signup'),
+    path('metrics', metrics, name='metrics'),
 ]
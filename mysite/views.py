@@ -8,12 +8,8 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import redirect, render
 from django.urls import reverse
 
+from .throttle import LoginThrottle, client_ip
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] %(levelname)-4s %(message)s',
-    datefmt='%d/%b/%Y %H:%M:%S',
-)
 logger = logging.getLogger(__name__)
 
 
@@ -40,10 +36,11 @@ def signup(request):
 
 @receiver(user_logged_in)
 def user_logged_in_callback(sender, request, user, **kwargs):
-    """Display log message, when successful login."""
+    """Display log message, when successful login, and forget the user's failures."""
+    LoginThrottle().reset(user.get_username())
     logger.info('user: {user} - login using ip: {ip}'.format(
         user=user,
-        ip=request.META.get('REMOTE_ADDR')
+        ip=client_ip(request)
     ))
 
 
@@ -58,8 +55,19 @@ def user_logged_out_callback(sender, request, user, **kwargs):
 
 @receiver(user_login_failed)
 def user_login_failed_callback(sender, request, credentials, **kwargs):
-    """Display log message, when unsuccessful login."""
-    logger.warning('user: {user} - failed to login using ip: {ip}'.format(
-        user=credentials['username'],
-        ip=request.META.get('REMOTE_ADDR')
-    ))
+    """Display log message with the throttle counters, when unsuccessful login.
+
+    Throttled attempts are not counted again, so the window can expire.
+    """
+    throttle = LoginThrottle()
+    username = credentials.get('username')
+    throttled = getattr(request, 'login_throttled', False)
+    if throttled:
+        counters = throttle.counters(request, username)
+    else:
+        counters = throttle.record_failure(request, username)
+    logger.warning('user: {user} - {event} using ip: {ip}'.format(
+        user=username,
+        event='throttled login' if throttled else 'failed to login',
+        ip=client_ip(request)
+    ), extra=counters)
@@ -1,7 +1,41 @@
-"""Database controller for Admin to add/edit Question and Choice."""
+"""Database controller for Admin to add/edit Question and Choice, and browse Vote.
+
+The changelists are meant to stay fast with millions of rows: columns are
+computed in SQL, counts are bounded, searches are prefix searches served
+by the COLLATE NOCASE indexes of migration 0009 on SQLite, and foreign keys
+use autocomplete or raw id widgets instead of dropdowns.
+
+Counts stop at BoundedCountPaginator.count_limit, so the changelist pages
+end there: narrow the list with a search or a filter to reach later rows.
+
+With vote shards, the vote counts of the listed questions and choices are
+read from the shards, and the Vote changelist, which only lists the default
+database, is hidden.
+"""
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from .models import Choice, Question, Vote
+from .shards import apply_tallies, get_vote_totals, is_sharded
+
+
+class BoundedCountPaginator(Paginator):
+    """Paginator that counts at most count_limit rows.
 
-from .models import Choice, Question
+    Only the pages of the first count_limit rows are linked and reachable.
+    """
+
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        """Return the number of rows, up to count_limit."""
+        return self.object_list[:self.count_limit].count()
 
 
 class ChoiceInline(admin.TabularInline):
@@ -11,6 +45,31 @@ class ChoiceInline(admin.TabularInline):
     extra = 3
 
 
+class StatusListFilter(admin.SimpleListFilter):
+    """Filter questions by their status in the database."""
+
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        """Return the status choices."""
+        return [
+            (Question.SCHEDULED, 'Scheduled'),
+            (Question.OPEN, 'Open'),
+            (Question.CLOSED, 'Closed'),
+        ]
+
+    def queryset(self, request, queryset):
+        """Return the questions with the selected status."""
+        if self.value() == Question.SCHEDULED:
+            return queryset.scheduled()
+        if self.value() == Question.OPEN:
+            return queryset.open()
+        if self.value() == Question.CLOSED:
+            return queryset.closed()
+        return queryset
+
+
 class QuestionAdmin(admin.ModelAdmin):
     """Custom Question field for admin to create/edit a question."""
 
@@ -27,13 +86,142 @@ class QuestionAdmin(admin.ModelAdmin):
     list_display = (
         'question_text',
         'pub_date',
-        'is_published',
+        'published',
         'end_date',
-        'was_closed'
+        'closed',
+        'total_votes',
     )
-    list_filter = ['pub_date']
-    search_fields = ['question_text']
+    list_filter = [StatusListFilter, 'pub_date']
+    search_fields = ['^question_text']
+    paginator = BoundedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """Return the questions annotated with their status and vote total."""
+        totals = Choice.objects.filter(question=OuterRef('pk')).order_by().values('question').annotate(
+            total=Sum('votes')).values('total')
+        return super().get_queryset(request).with_status().annotate(
+            total_votes=Subquery(totals, output_field=IntegerField()))
+
+    def get_changelist_instance(self, request):
+        """Return the changelist, with the vote totals of its page read from the vote shards if any."""
+        changelist = super().get_changelist_instance(request)
+        if is_sharded():
+            changelist.result_list = list(changelist.result_list)
+            totals = get_vote_totals([question.id for question in changelist.result_list])
+            for question in changelist.result_list:
+                question.total_votes = totals.get(question.id, 0)
+        return changelist
+
+    def published(self, obj):
+        """Return true if the question was published."""
+        return obj.status != Question.SCHEDULED
+
+    published.admin_order_field = 'pub_date'
+    published.boolean = True
+    published.short_description = 'Published?'
+
+    def closed(self, obj):
+        """Return true if the question was closed."""
+        return obj.status == Question.CLOSED
+
+    closed.admin_order_field = 'end_date'
+    closed.boolean = True
+    closed.short_description = 'Closed?'
+
+    def total_votes(self, obj):
+        """Return a link to the votes of the question, labelled with their number."""
+        if is_sharded():
+            return obj.total_votes or 0
+        url = reverse('admin:polls_vote_changelist') + f'?question={obj.id}'
+        return format_html('<a href="{}">{}</a>', url, obj.total_votes or 0)
+
+    total_votes.short_description = 'Votes'
+
+
+class ChoiceAdmin(admin.ModelAdmin):
+    """Choice admin with the question picked by autocomplete."""
+
+    list_display = ('choice_text', 'question', 'votes')
+    list_select_related = ('question',)
+    autocomplete_fields = ['question']
+    search_fields = ['^choice_text']
+    paginator = BoundedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist_instance(self, request):
+        """Return the changelist, with the vote counts of its page read from the vote shards if any."""
+        changelist = super().get_changelist_instance(request)
+        if is_sharded():
+            changelist.result_list = list(changelist.result_list)
+            apply_tallies(changelist.result_list)
+        return changelist
+
+
+class QuestionIdListFilter(admin.SimpleListFilter):
+    """Filter by a question id from the URL, without listing every question."""
+
+    title = 'question'
+    parameter_name = 'question'
+
+    def lookups(self, request, model_admin):
+        """Return only the selected question, if any."""
+        question = Question.objects.filter(pk=self.value()).first() if str(self.value()).isdigit() else None
+        return [(str(question.id), str(question))] if question else []
+
+    def queryset(self, request, queryset):
+        """Return the votes of the selected question."""
+        if str(self.value()).isdigit():
+            return queryset.filter(question_id=self.value())
+        return queryset
+
+
+class VoteAdmin(admin.ModelAdmin):
+    """Read-only Vote admin; votes are changed by voting."""
+
+    list_display = ('id', 'question', 'choice', 'user')
+    list_select_related = ('question', 'choice', 'user')
+    list_filter = [QuestionIdListFilter]
+    search_fields = ['=user__username']
+    raw_id_fields = ('question', 'choice', 'user')
+    paginator = BoundedCountPaginator
+    show_full_result_count = False
+
+    def has_module_permission(self, request):
+        """Hide the votes of the default database when the votes are in shards."""
+        return not is_sharded() and super().has_module_permission(request)
+
+    def has_view_permission(self, request, obj=None):
+        """Return false when the votes are in shards."""
+        return not is_sharded() and super().has_view_permission(request, obj)
+
+    def has_add_permission(self, request):
+        """Return false, votes are only added by voting."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """Return false, votes are only changed by voting."""
+        return False
+
+    def get_actions(self, request):
+        """Return the actions without 'delete selected', deleting a vote would leave the tally wrong."""
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        """Show the vote without a delete link."""
+        return super().change_view(request, object_id, form_url, {**(extra_context or {}), 'show_delete': False})
+
+    def delete_view(self, request, object_id, extra_context=None):
+        """Refuse to delete a vote on its own.
+
+        has_delete_permission() is left to the user's permissions, so
+        deleting a question or a choice also deletes its votes.
+        """
+        raise PermissionDenied
 
 
 admin.site.register(Question, QuestionAdmin)
-admin.site.register(Choice)
+admin.site.register(Choice, ChoiceAdmin)
+admin.site.register(Vote, VoteAdmin)
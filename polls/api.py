@@ -0,0 +1,176 @@
+"""JSON results API for polls app.
+
+The views answer conditional requests from the Question.version and
+Question.results_modified stamps alone: the strong ETag changes on every
+vote, so an If-None-Match that still matches gets a 304 after one query on
+the question table, without reading the choices. With vote shards the
+stamps are read from the shards of the questions that exist.
+"""
+import hashlib
+
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_GET
+
+from . import shards
+from .models import Choice, Question
+from .rollups import get_timeline
+from .shards import is_sharded
+
+MAX_BULK_QUESTIONS = 100
+
+
+def get_stamps(request, question_ids):
+    """Return {question_id: (version, results_modified)}, read once per request."""
+    if not hasattr(request, '_polls_stamps'):
+        request._polls_stamps = {
+            question_id: (version, modified)
+            for question_id, version, modified in Question.objects.filter(
+                pk__in=question_ids
+            ).values_list('id', 'version', 'results_modified')
+        }
+        if is_sharded():
+            request._polls_stamps = shards.get_stamps(list(request._polls_stamps))
+    return request._polls_stamps
+
+
+def parse_ids(request):
+    """Return the sorted question ids of the ?ids=1,2,3 parameter.
+
+    Raises:
+        ValueError : if an id is not an integer or there are too many ids
+    """
+    ids = sorted({int(value) for value in request.GET.get('ids', '').split(',') if value.strip()})
+    if len(ids) > MAX_BULK_QUESTIONS:
+        raise ValueError(f'at most {MAX_BULK_QUESTIONS} ids')
+    return ids
+
+
+def results_data(question, choices):
+    """Return the JSON-serializable results of question."""
+    return {
+        'id': question.id,
+        'question_text': question.question_text,
+        'version': question.version,
+        'choices': [
+            {'id': choice.id, 'choice_text': choice.choice_text, 'votes': choice.votes}
+            for choice in choices
+        ],
+    }
+
+
+def question_etag(request, pk):
+    """Return the ETag of the results of that pk question, or None if it does not exist."""
+    stamp = get_stamps(request, [pk]).get(pk)
+    return None if stamp is None else f'{pk}-{stamp[0]}'
+
+
+def timeline_etag(request, pk):
+    """Return the ETag of the timeline of that pk question for the ?since= window, or None if it does not exist."""
+    etag = question_etag(request, pk)
+    if etag is None:
+        return None
+    return hashlib.sha1(f"{etag}?since={request.GET.get('since', '')}".encode()).hexdigest()
+
+
+def question_last_modified(request, pk):
+    """Return the last time a vote changed the results of that pk question."""
+    stamp = get_stamps(request, [pk]).get(pk)
+    return None if stamp is None else stamp[1]
+
+
+def bulk_etag(request):
+    """Return the ETag of the results of the ?ids= questions, or None if the ids are invalid."""
+    try:
+        ids = parse_ids(request)
+    except ValueError:
+        return None
+    stamps = get_stamps(request, ids)
+    key = ','.join(f'{question_id}-{stamps[question_id][0]}' for question_id in ids if question_id in stamps)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def bulk_last_modified(request):
+    """Return the latest results change of the ?ids= questions."""
+    try:
+        ids = parse_ids(request)
+    except ValueError:
+        return None
+    modified = [stamp[1] for stamp in get_stamps(request, ids).values() if stamp[1] is not None]
+    return max(modified, default=None)
+
+
+@require_GET
+@condition(etag_func=question_etag, last_modified_func=question_last_modified)
+def question_results(request, pk):
+    """JSON view of the results of that pk question.
+
+    Args:
+        pk (int): question's id
+
+    Returns:
+        JsonResponse : the question with its choice ids, texts and counts
+    """
+    if pk not in get_stamps(request, [pk]):
+        raise Http404('No Question matches the given query.')
+    question = Question.objects.get(pk=pk)
+    question.version = get_stamps(request, [pk])[pk][0]
+    choices = list(question.choice_set.order_by('id'))
+    shards.apply_tallies(choices)
+    return JsonResponse(results_data(question, choices))
+
+
+@require_GET
+@condition(etag_func=bulk_etag, last_modified_func=bulk_last_modified)
+def bulk_results(request):
+    """JSON view of the results of many questions, e.g. ?ids=1,2,3.
+
+    Unknown ids are left out of the response. The choices of every
+    question are read in one query.
+
+    Returns:
+        JsonResponse : {'questions': [...]} ordered by id
+        or 400 if the ids are invalid
+    """
+    try:
+        ids = parse_ids(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(f'Invalid ids: {error}')
+    questions = list(Question.objects.filter(pk__in=ids).order_by('id'))
+    shards.apply_stamps(questions)
+    all_choices = list(Choice.objects.filter(question_id__in=ids).order_by('id'))
+    shards.apply_tallies(all_choices)
+    choices = {}
+    for choice in all_choices:
+        choices.setdefault(choice.question_id, []).append(choice)
+    return JsonResponse({
+        'questions': [results_data(question, choices.get(question.id, [])) for question in questions],
+    })
+
+
+@require_GET
+@condition(etag_func=timeline_etag, last_modified_func=question_last_modified)
+def question_timeline(request, pk):
+    """JSON view of the hourly votes of that pk question, read from the rollups.
+
+    Args:
+        pk (int): question's id
+
+    Returns:
+        JsonResponse : {'id', 'timeline': [...]}, from the ?since= hour if given
+        or 400 if since is not a date
+    """
+    if pk not in get_stamps(request, [pk]):
+        raise Http404('No Question matches the given query.')
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            since = None
+        if since is None:
+            return HttpResponseBadRequest('Invalid since: expected an ISO 8601 date and time')
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    return JsonResponse({'id': pk, 'timeline': get_timeline(pk, since)})
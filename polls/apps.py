@@ -6,3 +6,8 @@ class PollsConfig(AppConfig):
     """polls app config."""
 
     name = 'polls'
+
+    def ready(self):
+        """Connect the signal receivers, including those invalidating the cached users."""
+        from mysite import auth  # noqa: F401
+        from . import signals  # noqa: F401
@@ -0,0 +1,101 @@
+"""Async views for polls app, served when settings.POLLS_ASYNC_VIEWS is on.
+
+Django 3.1 has no async ORM or async session/auth API, so each view does all
+of its database work (session, user, questions, votes) in a single
+sync_to_async call and renders the response in the event loop. Sync views
+under ASGI take a thread for the whole request instead.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+
+from .cache import get_results_table
+from .models import Choice, Question
+from .views import get_detail_context, get_index_page, save_vote
+
+
+def load_user(request):
+    """Load the session and request.user so templates can use them without queries."""
+    return request.user.is_authenticated
+
+
+def async_login_required(view):
+    """Async version of django.contrib.auth.decorators.login_required."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(load_user)(request):
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@sync_to_async
+def load_index(request):
+    """Return the context of the index page."""
+    load_user(request)
+    page = get_index_page(request)
+    return {'latest_question_list': page.object_list, 'page': page}
+
+
+@sync_to_async
+def load_detail(request, question_id):
+    """Return the context of the detail page, or None if the question is not open."""
+    question = get_object_or_404(Question.objects.with_status(), pk=question_id)
+    if question.status != Question.OPEN:
+        msg = f"Poll: \"{question.question_text}\" is not longer publish."
+        messages.error(request, msg)
+        return None
+    return get_detail_context(request, question)
+
+
+@sync_to_async
+def load_results(request, pk):
+    """Return the context of the results page."""
+    load_user(request)
+    question = get_object_or_404(Question, pk=pk)
+    return {'question': question, 'results_table': get_results_table(question), 'live': 'live' in request.GET}
+
+
+@sync_to_async
+def submit_vote(request, question_id):
+    """Save the vote and return (question, None), or (question, detail context) without a choice."""
+    question = get_object_or_404(Question, pk=question_id)
+    try:
+        selected_choice = question.choice_set.get(pk=request.POST['choice'])
+    except (KeyError, Choice.DoesNotExist):
+        return question, get_detail_context(request, question, error_message="You didn't select a choice.")
+    save_vote(request, question, selected_choice)
+    return question, None
+
+
+async def index(request):
+    """Async view for index page, see polls.views.IndexView."""
+    return render(request, 'polls/index.html', await load_index(request))
+
+
+@async_login_required
+async def detail(request, question_id):
+    """Async view for detail page, see polls.views.detail."""
+    context = await load_detail(request, question_id)
+    if context is None:
+        return HttpResponseRedirect(reverse('polls:index'))
+    return render(request, 'polls/detail.html', context)
+
+
+async def results(request, pk):
+    """Async view for results page, see polls.views.ResultsView."""
+    return render(request, 'polls/results.html', await load_results(request, pk))
+
+
+@async_login_required
+async def vote(request, question_id):
+    """Async view for vote page, see polls.views.vote."""
+    question, error_context = await submit_vote(request, question_id)
+    if error_context is not None:
+        return render(request, 'polls/detail.html', error_context)
+    return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
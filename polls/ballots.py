@@ -0,0 +1,93 @@
+"""Per-request map of the current user's votes."""
+from django.conf import settings
+
+from .models import Vote
+from .shards import get_user_choices, is_sharded
+from .writebehind import get_vote_buffer
+
+
+class UserBallot:
+    """The (question_id -> choice_id) votes of one user.
+
+    Votes are loaded from the database at most once per question: either
+    every vote of the user with load_all(), or only the votes of the given
+    questions with load(). Lookups of loaded questions run no queries.
+    With vote shards, each load runs one query per shard involved.
+    In write-behind mode, votes still in this process's buffer take
+    precedence over the database.
+
+    Args:
+        user : Current user
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._choices = {}
+        self._loaded = set()
+        self._complete = not user.is_authenticated
+
+    def load(self, question_ids):
+        """Load the user's votes of question_ids in one query, skipping loaded ones."""
+        missing = {question_id for question_id in question_ids if question_id not in self._loaded}
+        if self._complete or not missing:
+            return
+        if is_sharded():
+            self._choices.update(get_user_choices(self.user.id, missing))
+        else:
+            self._choices.update(
+                Vote.objects.filter(user=self.user, question_id__in=missing).values_list('question_id', 'choice_id')
+            )
+        self._loaded |= missing
+
+    def load_all(self):
+        """Load every vote of the user in one query."""
+        if self._complete:
+            return
+        if is_sharded():
+            self._choices = get_user_choices(self.user.id)
+        else:
+            self._choices = dict(Vote.objects.filter(user=self.user).values_list('question_id', 'choice_id'))
+        self._complete = True
+
+    def get(self, question_id):
+        """Return the id of the choice the user voted for, or None."""
+        if settings.POLLS_VOTE_WRITE_BEHIND and self.user.is_authenticated:
+            pending = get_vote_buffer().pending_choice(self.user.id, question_id)
+            if pending is not None:
+                return pending
+        self.load([question_id])
+        return self._choices.get(question_id)
+
+    def record(self, question_id, choice_id):
+        """Remember a vote the user just made."""
+        self._choices[question_id] = choice_id
+        self._loaded.add(question_id)
+
+    def invalidate(self):
+        """Forget the loaded votes so the next lookup reads the database again."""
+        self._choices = {}
+        self._loaded = set()
+        self._complete = not self.user.is_authenticated
+
+    def status(self, question_id, choices):
+        """Return a string represent of the user vote status.
+
+        Args:
+            question_id : the question's id
+            choices : the choices of that question
+
+        Return:
+            String : the user vote status
+        """
+        choice_id = self.get(question_id)
+        for choice in choices:
+            if choice.id == choice_id:
+                return f"{self.user.username} have voted for {choice}"
+        return f"{self.user.username} have never voted for this question before"
+
+
+def get_ballot(request):
+    """Return the UserBallot of request.user, created once per request."""
+    if not hasattr(request, '_polls_ballot'):
+        request._polls_ballot = UserBallot(request.user)
+    return request._polls_ballot
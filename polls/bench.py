@@ -0,0 +1,342 @@
+"""Dataset, clients and report helpers of the benchpolls command.
+
+A Benchmark fills the throwaway test database and sends requests to the
+polls endpoints, one client at a time, from concurrent WSGI threads or from
+asyncio tasks. The scenarios built on top of it are in polls/bench_scenarios.py.
+"""
+import asyncio
+import datetime
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Choice, Question, Vote
+
+ENDPOINTS = ('index', 'detail', 'vote', 'results')
+
+
+def percentile(values, pct):
+    """Return the pct percentile of values using linear interpolation.
+
+    Args:
+        values : list of numbers
+        pct : percentile between 0 and 100
+
+    Returns:
+        float : the percentile, or 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(latencies, query_counts, query_times, elapsed, errors=0, template_times=()):
+    """Return the report of one endpoint.
+
+    Args:
+        latencies : latency of each request in seconds
+        query_counts : number of SQL queries of each request
+        query_times : SQL time of each request in seconds
+        elapsed : wall time of the whole run in seconds
+        errors : number of requests that failed
+        template_times : template render time of each request in seconds
+
+    Returns:
+        dict : requests/sec, latency percentiles (ms) and SQL statistics
+    """
+    requests = len(latencies)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'rps': requests / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_request': sum(query_counts) / requests if requests else 0.0,
+        'sql_ms_per_request': sum(query_times) * 1000 / requests if requests else 0.0,
+        'template_ms_per_request': sum(template_times) * 1000 / requests if requests else 0.0,
+    }
+
+
+def template_seconds(response):
+    """Return the template render time of the response's Server-Timing header."""
+    match = re.search(r'tpl;dur=([\d.]+)', response.get('Server-Timing', ''))
+    return float(match.group(1)) / 1000 if match else 0.0
+
+
+class QueryTimer:
+    """Database execute wrapper counting and timing the queries of a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def compare_results(baseline, current, threshold):
+    """Return the regressions of current against baseline.
+
+    An endpoint regresses when its requests/sec drops or its p95 latency
+    grows by more than threshold percent, or when it runs more queries.
+
+    Args:
+        baseline : a previous benchpolls report
+        current : the new benchpolls report
+        threshold : allowed change in percent
+
+    Returns:
+        list : human readable regression messages
+    """
+    regressions = []
+    limit = threshold / 100
+    for name, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        if before['rps'] and now['rps'] < before['rps'] * (1 - limit):
+            regressions.append(f"{name}: rps {before['rps']:.1f} -> {now['rps']:.1f}")
+        if before['p95_ms'] and now['p95_ms'] > before['p95_ms'] * (1 + limit):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {now['p95_ms']:.2f}ms")
+        if now['queries_per_request'] > before['queries_per_request']:
+            regressions.append(
+                f"{name}: queries {before['queries_per_request']:.1f} -> {now['queries_per_request']:.1f}"
+            )
+    return regressions
+
+
+class Benchmark:
+    """The generated dataset of a benchpolls run and the clients sending requests to it.
+
+    Args:
+        options : the benchpolls options (dataset size, requests, seed)
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.question_ids = []
+        self.choices = {}
+        self.replicas = []
+        self.vote_shards = []
+
+    def build_dataset(self):
+        """Create users, open questions, choices and votes with bulk inserts."""
+        options = self.options
+        rng = random.Random(options['seed'])
+        password = make_password('benchpolls')
+        User = get_user_model()
+        User.objects.bulk_create(
+            User(username=f'bench{i}', password=password) for i in range(options['users'])
+        )
+        now = timezone.now()
+        Question.objects.bulk_create(
+            Question(
+                question_text=f'Question {i}',
+                pub_date=now - datetime.timedelta(days=1, minutes=i),
+                end_date=now + datetime.timedelta(days=365),
+            )
+            for i in range(options['questions'])
+        )
+        question_ids = list(Question.objects.values_list('id', flat=True))
+        Choice.objects.bulk_create(
+            Choice(question_id=question_id, choice_text=f'Choice {j}')
+            for question_id in question_ids
+            for j in range(options['choices'])
+        )
+        choices = {}
+        for choice_id, question_id in Choice.objects.values_list('id', 'question_id'):
+            choices.setdefault(question_id, []).append(choice_id)
+        user_ids = list(User.objects.values_list('id', flat=True))
+        pairs = rng.sample(range(len(question_ids) * len(user_ids)), options['votes'])
+        votes = []
+        for pair in pairs:
+            question_id = question_ids[pair // len(user_ids)]
+            votes.append(Vote(
+                question_id=question_id,
+                choice_id=rng.choice(choices[question_id]),
+                user_id=user_ids[pair % len(user_ids)],
+            ))
+        Vote.objects.bulk_create(votes, batch_size=500)
+        tallies = Counter(vote.choice_id for vote in votes)
+        Choice.objects.bulk_update(
+            [Choice(id=choice_id, votes=count) for choice_id, count in tallies.items()],
+            ['votes'], batch_size=500,
+        )
+        self.question_ids = question_ids
+        self.choices = choices
+
+    def request(self, client, name, question_id, i):
+        """Send one request to the endpoint."""
+        if name == 'index':
+            return client.get(reverse('polls:index'))
+        if name == 'detail':
+            return client.get(reverse('polls:detail', args=(question_id,)))
+        if name == 'results':
+            return client.get(reverse('polls:results', args=(question_id,)))
+        choices = self.choices[question_id]
+        return client.post(
+            reverse('polls:vote', args=(question_id,)),
+            urlencode({'choice': choices[i % len(choices)]}),
+            content_type='application/x-www-form-urlencoded',
+        )
+
+    def run_sequential(self, name, client):
+        """Send --requests requests to the endpoint one after the other, with SQL and template timings."""
+        latencies, query_counts, query_times, template_times = [], [], [], []
+        started = time.perf_counter()
+        for i in range(self.options['requests']):
+            question_id = self.question_ids[i % len(self.question_ids)]
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                request_started = time.perf_counter()
+                response = self.request(client, name, question_id, i)
+                latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                raise CommandError(f'{name} returned HTTP {response.status_code}.')
+            query_counts.append(timer.count)
+            query_times.append(timer.seconds)
+            template_times.append(template_seconds(response))
+        elapsed = time.perf_counter() - started
+        return summarize(latencies, query_counts, query_times, elapsed, template_times=template_times)
+
+    def run_threads(self, name, workers):
+        """Send requests from concurrent WSGI clients, each with its own thread and connection."""
+        return self.run_mixed({name: workers})[name]
+
+    def run_mixed(self, workers, prepare=None):
+        """Send requests to several endpoints at once from concurrent WSGI clients.
+
+        Args:
+            workers : endpoint name -> number of clients sending to it
+            prepare : called once every client has logged in, before the clock starts
+
+        Returns:
+            dict : endpoint name -> its report
+        """
+        options = self.options
+        names = [name for name, count in workers.items() for _ in range(count)]
+        users = list(get_user_model().objects.order_by('id')[:len(names)])
+        stats = {name: ([], [], [], []) for name in workers}
+        finished = dict.fromkeys(workers, 0.0)
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(names) + 1)
+
+        def send(k):
+            client = Client()
+            client.force_login(users[k])
+            rng = random.Random(options['seed'] + k)
+            latencies, query_counts, query_times, errors = stats[names[k]]
+            barrier.wait()
+            barrier.wait()
+            try:
+                for i in range(options['requests']):
+                    question_id = rng.choice(self.question_ids)
+                    timer = QueryTimer()
+                    request_started = time.perf_counter()
+                    try:
+                        with ExitStack() as stack:
+                            for alias in connections:
+                                stack.enter_context(connections[alias].execute_wrapper(timer))
+                            response = self.request(client, names[k], question_id, i)
+                        failed = response.status_code >= 400
+                    except OperationalError:
+                        failed = True
+                    with lock:
+                        latencies.append(time.perf_counter() - request_started)
+                        query_counts.append(timer.count)
+                        query_times.append(timer.seconds)
+                        if failed:
+                            errors.append(question_id)
+            finally:
+                connections.close_all()
+                with lock:
+                    finished[names[k]] = max(finished[names[k]], time.perf_counter())
+
+        threads = [threading.Thread(target=send, args=(k,)) for k in range(len(names))]
+        # Failed requests are counted; their tracebacks would flood the output.
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        try:
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            if prepare is not None:
+                prepare()
+            barrier.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+        finally:
+            request_logger.disabled = False
+        # Each endpoint's rate runs until its last client finished.
+        return {
+            name: summarize(latencies, query_counts, query_times, finished[name] - started, errors=len(errors))
+            for name, (latencies, query_counts, query_times, errors) in stats.items()
+        }
+
+    def run_asyncio(self, name, workers):
+        """Send requests from concurrent ASGI clients running as asyncio tasks.
+
+        The database work runs in threads managed by Django, so SQL
+        statistics are not collected for ASGI runs.
+        """
+        options = self.options
+        clients = []
+        for user in get_user_model().objects.order_by('id')[:workers]:
+            client = AsyncClient()
+            client.force_login(user)
+            clients.append(client)
+        latencies, errors = [], []
+
+        async def send(k):
+            rng = random.Random(options['seed'] + k)
+            for i in range(options['requests']):
+                question_id = rng.choice(self.question_ids)
+                request_started = time.perf_counter()
+                try:
+                    response = await self.request(clients[k], name, question_id, i)
+                    failed = response.status_code >= 400
+                except OperationalError:
+                    failed = True
+                latencies.append(time.perf_counter() - request_started)
+                if failed:
+                    errors.append(question_id)
+
+        async def main():
+            started = time.perf_counter()
+            await asyncio.gather(*(send(k) for k in range(workers)))
+            elapsed = time.perf_counter() - started
+            await sync_to_async(connections.close_all)()
+            return elapsed
+
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        try:
+            elapsed = asyncio.run(main())
+        finally:
+            request_logger.disabled = False
+        return summarize(latencies, [], [], elapsed, errors=len(errors))
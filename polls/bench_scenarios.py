@@ -0,0 +1,118 @@
+"""Scenarios of the benchpolls command, run on a polls.bench.Benchmark.
+
+Each scenario returns the reports of its endpoints. A scenario that runs
+with other settings, such as read replicas, vote shards or login
+throttling, changes them with override_settings, so they are restored even
+when the scenario fails.
+"""
+import logging
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.core.management import call_command
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from mysite.routers import sync_replica
+
+from .bench import summarize
+
+
+def run_endpoints(bench, client, endpoints):
+    """Send --requests requests to each endpoint from one client."""
+    return {name: bench.run_sequential(name, client) for name in endpoints}
+
+
+def run_concurrent_votes(bench, workers):
+    """Vote from concurrent WSGI clients."""
+    return {'concurrent_vote': bench.run_threads('vote', workers)}
+
+
+def run_wsgi_vs_asgi(bench, endpoints, workers):
+    """Run each endpoint from concurrent WSGI threads and then from asyncio tasks."""
+    report = {}
+    for name in endpoints:
+        report[f'wsgi_{name}'] = bench.run_threads(name, workers)
+        report[f'asgi_{name}'] = bench.run_asyncio(name, workers)
+    return report
+
+
+def run_read_scaling(bench, clients):
+    """Run results readers next to voters, on the primary alone and then with the replicas.
+
+    The replicas are copied from the primary and switched on once every
+    client has logged in, so they hold the sessions. They are not
+    refreshed during the run: the readers see the results as of the start.
+    """
+    readers, voters = clients - clients // 2, clients // 2
+    report = {}
+    for label, replicas in (('primary', []), ('replicas', bench.replicas)):
+        with ExitStack() as stack:
+            def use_replicas(replicas=replicas):
+                for alias in replicas:
+                    sync_replica(alias)
+                stack.enter_context(override_settings(DATABASE_REPLICAS=replicas))
+
+            mixed = bench.run_mixed({'results': readers, 'vote': voters}, prepare=use_replicas)
+        report[f'{label}_read'] = mixed['results']
+        report[f'{label}_vote'] = mixed['vote']
+    return report
+
+
+def migrate_vote_shards(aliases):
+    """Create the shard tables in the benchmark's vote shards."""
+    with override_settings(POLLS_VOTE_SHARDS=aliases):
+        for alias in aliases:
+            call_command('migrate', database=alias, verbosity=0)
+
+
+def run_vote_sharding(bench, voters):
+    """Run concurrent voters on the default database alone and then with the vote shards.
+
+    The shards start empty: the existing votes stay in the default
+    database, so the sharded run inserts votes the first run updated.
+    """
+    report = {}
+    for label, shards in (('unsharded', []), ('sharded', bench.vote_shards)):
+        with ExitStack() as stack:
+            def use_shards(shards=shards):
+                stack.enter_context(override_settings(POLLS_VOTE_SHARDS=shards))
+
+            report[f'{label}_vote'] = bench.run_mixed({'vote': voters}, prepare=use_shards)['vote']
+    return report
+
+
+def run_login_attack(attempts, throttle):
+    """Send failed logins for a few usernames from one IP and measure the CPU time they cost.
+
+    Each run uses its own IP and usernames, so the runs do not share
+    throttle counters.
+    """
+    run = uuid.uuid4().hex[:8]
+    client = Client(REMOTE_ADDR=f'198.51.100.{1 + throttle}')
+    latencies = []
+    # Each failure is logged; the attack would flood the output.
+    auth_logger = logging.getLogger('mysite.views')
+    auth_logger.disabled = True
+    try:
+        with override_settings(LOGIN_THROTTLE=throttle):
+            cpu_started, started = time.process_time(), time.perf_counter()
+            for i in range(attempts):
+                request_started = time.perf_counter()
+                client.post(reverse('login'), {'username': f'attacker-{run}-{i % 10}', 'password': 'guess'})
+                latencies.append(time.perf_counter() - request_started)
+            elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    finally:
+        auth_logger.disabled = False
+    result = summarize(latencies, [], [], elapsed)
+    result['cpu_ms_per_request'] = cpu * 1000 / attempts
+    return result
+
+
+def run_login_attacks(attempts):
+    """Run the login attack without and then with login throttling."""
+    return {
+        'login_attack': run_login_attack(attempts, throttle=False),
+        'login_throttled': run_login_attack(attempts, throttle=True),
+    }
@@ -0,0 +1,88 @@
+"""Cache of the rendered results table, keyed on the question version.
+
+Also holds the content version that keys the {% cache %} template
+fragments of the polls pages.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .shards import apply_stamps, apply_tallies
+
+CONTENT_VERSION_KEY = 'polls:content-version'
+HITS_KEY = 'polls:results:hits'
+MISSES_KEY = 'polls:results:misses'
+
+
+def get_cache():
+    """Return the cache used for the results table."""
+    return caches[settings.POLLS_RESULTS_CACHE]
+
+
+def results_table_key(question):
+    """Return the cache key of the results table of that version of question."""
+    return f'polls:results:{question.id}:{question.version}'
+
+
+def increment(cache, key):
+    """Increment a counter, creating it if needed."""
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr().
+        cache.set(key, 1, timeout=None)
+
+
+def get_results_table(question):
+    """Return the rendered results table of question.
+
+    The table is rendered once per question version. Voting or editing a
+    choice increments the version, so stale entries are never read and
+    simply expire. With vote shards, the version and the counts are read
+    from the question's shard.
+
+    Args:
+        question : the question with its current version
+
+    Returns:
+        SafeString : the results table html
+    """
+    apply_stamps([question])
+    cache = get_cache()
+    key = results_table_key(question)
+    html = cache.get(key)
+    if html is None:
+        increment(cache, MISSES_KEY)
+        choices = list(question.choice_set.all())
+        apply_tallies(choices)
+        html = render_to_string('polls/results_table.html', {'choices': choices})
+        cache.set(key, str(html), settings.POLLS_RESULTS_CACHE_TIMEOUT)
+    else:
+        increment(cache, HITS_KEY)
+    return mark_safe(html)
+
+
+def results_cache_stats():
+    """Return the hit and miss counters of the results cache."""
+    cache = get_cache()
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def get_content_version():
+    """Return the version of the questions and choices used in template fragment keys."""
+    cache = caches['default']
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        cache.add(CONTENT_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CONTENT_VERSION_KEY, 1)
+    return version
+
+
+def bump_content_version():
+    """Make every cached template fragment stale, when a question or choice changes."""
+    increment(caches['default'], CONTENT_VERSION_KEY)
@@ -0,0 +1,16 @@
+"""Context processors for polls app."""
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_content_version
+
+
+def fragments(request):
+    """Add the key and timeout of the {% cache %} fragments of the polls pages.
+
+    The content version is only read from the cache by templates using it.
+    """
+    return {
+        'content_version': SimpleLazyObject(get_content_version),
+        'fragment_timeout': settings.POLLS_FRAGMENT_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,195 @@
+"""Live results of a question streamed as Server-Sent Events.
+
+Each worker process runs at most one QuestionPoller thread per question,
+shared by every client streaming that question. The poller reads the cheap
+Question.version stamp every POLLS_STREAM_POLL_INTERVAL seconds and only
+reads the choice counts when the stamp changed; clients then receive the
+counts that changed since their last event. With vote shards, the stamp
+and the counts are read from the question's shard.
+
+Every open stream holds a WSGI worker thread, so a process serves at most
+POLLS_STREAM_MAX_CLIENTS streams; further clients get a 503 with a
+Retry-After header instead of starving the other pages of threads.
+
+Under ASGI, Django 3.1 iterates streaming responses in the event loop, so
+the stream should be served by WSGI workers.
+"""
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .models import Choice, Question
+from .shards import get_stamps, get_tallies, is_sharded
+
+logger = logging.getLogger(__name__)
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+_open_streams = 0
+
+# Seconds a client turned away by POLLS_STREAM_MAX_CLIENTS should wait.
+STREAM_RETRY_AFTER = 30
+
+
+class QuestionPoller:
+    """Watch the results of one question for every subscriber in this process.
+
+    Args:
+        question_id : the question's id
+        interval : seconds between two reads of the version stamp
+    """
+
+    def __init__(self, question_id, interval):
+        self.question_id = question_id
+        self.interval = interval
+        self.version = None
+        self.counts = {}
+        self.subscribers = 0
+        self.condition = threading.Condition()
+
+    def poll(self):
+        """Read the version stamp and reload the counts if it changed."""
+        if is_sharded():
+            version = get_stamps([self.question_id])[self.question_id][0]
+        else:
+            version = Question.objects.filter(pk=self.question_id).values_list('version', flat=True).first()
+        if version == self.version:
+            return
+        counts = dict(Choice.objects.filter(question_id=self.question_id).values_list('id', 'votes'))
+        if is_sharded():
+            tallies = get_tallies([self.question_id])
+            counts = {choice_id: tallies.get(choice_id, 0) for choice_id in counts}
+        with self.condition:
+            self.version, self.counts = version, counts
+            self.condition.notify_all()
+
+    def wait(self, version, timeout):
+        """Wait until the version differs from version, at most timeout seconds.
+
+        Returns:
+            tuple : the current (version, counts)
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version, dict(self.counts)
+
+    def run(self):
+        """Poll until the last subscriber leaves.
+
+        A failed read, such as a locked database under write load, is logged
+        and retried at the next interval, so the subscribers keep a live poller.
+        """
+        try:
+            while True:
+                with _pollers_lock:
+                    if not self.subscribers:
+                        del _pollers[self.question_id]
+                        return
+                try:
+                    self.poll()
+                except DatabaseError:
+                    logger.exception('Live results poll of question %s failed', self.question_id)
+                    connections.close_all()
+                time.sleep(self.interval)
+        finally:
+            with _pollers_lock:
+                if _pollers.get(self.question_id) is self:
+                    del _pollers[self.question_id]
+            connections.close_all()
+
+
+def subscribe(question_id):
+    """Return the poller of question_id, starting it if needed."""
+    with _pollers_lock:
+        poller = _pollers.get(question_id)
+        if poller is None:
+            poller = _pollers[question_id] = QuestionPoller(question_id, settings.POLLS_STREAM_POLL_INTERVAL)
+            threading.Thread(target=poller.run, daemon=True).start()
+        poller.subscribers += 1
+        return poller
+
+
+def unsubscribe(poller):
+    """Stop receiving updates from poller."""
+    with _pollers_lock:
+        poller.subscribers -= 1
+
+
+def results_event(version, old_counts, new_counts):
+    """Return the SSE message with the counts that changed.
+
+    Args:
+        version : the question version of new_counts
+        old_counts : choice id -> votes already sent to the client
+        new_counts : choice id -> votes now
+
+    Returns:
+        String : a 'results' event
+    """
+    data = {
+        'version': version,
+        'choices': {choice_id: votes for choice_id, votes in new_counts.items() if old_counts.get(choice_id) != votes},
+        'removed': [choice_id for choice_id in old_counts if choice_id not in new_counts],
+    }
+    return f'id: {version}\nevent: results\ndata: {json.dumps(data)}\n\n'
+
+
+class ResultsStream:
+    """The messages of stream_results, holding a stream slot of this process until closed.
+
+    The response closes the stream when it is done, even if it was never
+    iterated, which a generator's finally block would miss.
+    """
+
+    def __init__(self, question_id):
+        self.messages = stream_results(question_id)
+        self.closed = False
+
+    def __iter__(self):
+        return self.messages
+
+    def close(self):
+        """Stop the messages and free the slot."""
+        global _open_streams
+        self.messages.close()
+        with _pollers_lock:
+            if not self.closed:
+                self.closed = True
+                _open_streams -= 1
+
+
+def open_stream(question_id):
+    """Return a ResultsStream of the question, or None if POLLS_STREAM_MAX_CLIENTS streams are open."""
+    global _open_streams
+    with _pollers_lock:
+        if _open_streams >= settings.POLLS_STREAM_MAX_CLIENTS:
+            return None
+        _open_streams += 1
+    return ResultsStream(question_id)
+
+
+def stream_results(question_id):
+    """Yield SSE messages with the changes of the question's results.
+
+    The stream ends after POLLS_STREAM_MAX_SECONDS; browsers reconnect on
+    their own. A comment is sent every POLLS_STREAM_HEARTBEAT seconds
+    without changes to keep proxies from closing the connection.
+    """
+    poller = subscribe(question_id)
+    try:
+        version, counts = None, {}
+        deadline = time.monotonic() + settings.POLLS_STREAM_MAX_SECONDS
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            new_version, new_counts = poller.wait(version, settings.POLLS_STREAM_HEARTBEAT)
+            if new_version == version:
+                yield ': keep-alive\n\n'
+                continue
+            yield results_event(new_version, counts, new_counts)
+            version, counts = new_version, new_counts
+    finally:
+        unsubscribe(poller)
@@ -0,0 +1,184 @@
+"""Benchmark the polls hot paths in-process with the test client.
+
+The dataset and the clients are in polls/bench.py, the scenarios in
+polls/bench_scenarios.py.
+"""
+import json
+import os
+import platform
+import tempfile
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from polls import bench_scenarios
+from polls.bench import ENDPOINTS, Benchmark, compare_results
+from polls.cache import results_cache_stats
+
+
+class Command(BaseCommand):
+    """Drive detail, vote, results and index views against a generated dataset."""
+
+    help = 'Benchmark the polls views in a throwaway test database and report rps, latency and SQL cost.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=50, help='number of questions')
+        parser.add_argument('--choices', type=int, default=4, help='choices per question')
+        parser.add_argument('--users', type=int, default=100, help='number of users')
+        parser.add_argument('--votes', type=int, default=2000, help='number of existing votes')
+        parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS,
+                            help='endpoint to benchmark (repeatable, default: all)')
+        parser.add_argument('--seed', type=int, default=0, help='random seed of the dataset')
+        parser.add_argument('--vote-workers', type=int, default=0,
+                            help='also run --requests votes from each of N concurrent voters')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='also run each endpoint side by side through WSGI (N threads) '
+                                 'and ASGI (N asyncio tasks), --requests per worker')
+        parser.add_argument('--replicas', type=int, default=0, metavar='N',
+                            help='also run --concurrency clients, half reading results and half voting, '
+                                 'on the primary alone and with N SQLite read replicas')
+        parser.add_argument('--vote-shards', type=int, default=0, metavar='N',
+                            help='also run --concurrency voters on the default database alone '
+                                 'and with the votes in N SQLite shards')
+        parser.add_argument('--database-file',
+                            help='SQLite file of the benchmark database (default: in memory, '
+                                 'or a temporary file with --vote-workers/--concurrency)')
+        parser.add_argument('--login-attack', type=int, default=0, metavar='N',
+                            help='also send N failed logins from one IP, without and with login throttling')
+        parser.add_argument('--fragment-cache-timeout', type=int,
+                            help='override POLLS_FRAGMENT_CACHE_TIMEOUT, 0 renders every fragment')
+        parser.add_argument('--output', help='write the JSON report to this file')
+        parser.add_argument('--compare', metavar='BASELINE', help='JSON report to compare against')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='allowed regression in percent for --compare (default: 10)')
+
+    def handle(self, *args, **options):
+        if options['votes'] > options['questions'] * options['users']:
+            raise CommandError('--votes cannot exceed --questions * --users (one vote per user and question).')
+        if max(options['vote_workers'], options['concurrency']) > options['users']:
+            raise CommandError('--vote-workers and --concurrency cannot exceed --users.')
+        if options['replicas'] and (options['concurrency'] < 2 or connection.vendor != 'sqlite'):
+            raise CommandError('--replicas needs SQLite and --concurrency of at least 2.')
+        if options['vote_shards'] and (options['concurrency'] < 2 or connection.vendor != 'sqlite'):
+            raise CommandError('--vote-shards needs SQLite and --concurrency of at least 2.')
+        concurrent = options['vote_workers'] or options['concurrency']
+        database_file = options['database_file']
+        if concurrent and not database_file and connection.vendor == 'sqlite':
+            # Concurrent voters need real file locking, not a shared in-memory database.
+            database_file = os.path.join(tempfile.mkdtemp(), 'benchpolls.sqlite3')
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        if database_file:
+            test_settings['NAME'] = database_file
+        bench = Benchmark(options)
+        with ExitStack() as stack:
+            if options['fragment_cache_timeout'] is not None:
+                stack.enter_context(override_settings(POLLS_FRAGMENT_CACHE_TIMEOUT=options['fragment_cache_timeout']))
+            setup_test_environment()
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                bench.build_dataset()
+                bench.replicas = self.add_databases('bench_replica{}', range(1, options['replicas'] + 1),
+                                                    database_file, '-replica{}')
+                bench.vote_shards = self.add_databases('bench_votes{}', range(options['vote_shards']),
+                                                       database_file, '-votes{}')
+                bench_scenarios.migrate_vote_shards(bench.vote_shards)
+                report = self.run(bench, options)
+            finally:
+                connections.close_all()
+                for alias in bench.replicas + bench.vote_shards:
+                    if os.path.exists(connections[alias].settings_dict['NAME']):
+                        os.remove(connections[alias].settings_dict['NAME'])
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+                test_settings['NAME'] = old_test_name
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = compare_results(baseline, report, options['threshold'])
+            if regressions:
+                for message in regressions:
+                    self.stdout.write(self.style.ERROR(f'REGRESSION {message}'))
+                raise CommandError(f'{len(regressions)} regression(s) past {options["threshold"]}%.')
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
+
+    @staticmethod
+    def add_databases(alias_format, numbers, database_file, suffix_format):
+        """Add SQLite databases next to the benchmark database and return their aliases."""
+        aliases = []
+        for number in numbers:
+            alias = alias_format.format(number)
+            connections.databases[alias] = {
+                **connection.settings_dict,
+                'NAME': f'{os.path.splitext(database_file)[0]}{suffix_format.format(number)}.sqlite3',
+            }
+            aliases.append(alias)
+        return aliases
+
+    def run(self, bench, options):
+        """Run the selected scenarios and return the report."""
+        client = Client()
+        client.force_login(get_user_model().objects.get(username='bench0'))
+        endpoints = options['endpoint'] or ENDPOINTS
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'database_profile': settings.DATABASE_PROFILE,
+                'sqlite_pragmas': settings.SQLITE_PRAGMAS,
+                'async_views': settings.POLLS_ASYNC_VIEWS,
+                'replicas': len(bench.replicas),
+                'vote_shards': len(bench.vote_shards),
+                'fragment_cache_timeout': settings.POLLS_FRAGMENT_CACHE_TIMEOUT,
+                'login_throttle': {
+                    'window': settings.LOGIN_THROTTLE_WINDOW,
+                    'ip_limit': settings.LOGIN_THROTTLE_IP_LIMIT,
+                    'username_limit': settings.LOGIN_THROTTLE_USERNAME_LIMIT,
+                },
+                'template_loaders': settings.TEMPLATES[0]['OPTIONS'].get('loaders', 'default'),
+                'dataset': {key: options[key] for key in ('questions', 'choices', 'users', 'votes', 'seed')},
+            },
+            'endpoints': bench_scenarios.run_endpoints(bench, client, endpoints),
+        }
+        if options['vote_workers']:
+            report['endpoints'].update(bench_scenarios.run_concurrent_votes(bench, options['vote_workers']))
+        if options['concurrency']:
+            report['endpoints'].update(bench_scenarios.run_wsgi_vs_asgi(bench, endpoints, options['concurrency']))
+        if options['replicas']:
+            report['endpoints'].update(bench_scenarios.run_read_scaling(bench, options['concurrency']))
+        if options['vote_shards']:
+            report['endpoints'].update(bench_scenarios.run_vote_sharding(bench, options['concurrency']))
+        report['meta']['results_cache'] = results_cache_stats()
+        if options['login_attack']:
+            report['endpoints'].update(bench_scenarios.run_login_attacks(options['login_attack']))
+        return report
+
+    def print_report(self, report):
+        """Write the report as a table."""
+        self.stdout.write(f"{'endpoint':<16}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+                          f"{'queries':>10}{'sql ms':>10}{'tpl ms':>10}{'errors':>8}")
+        for name, result in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<16}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}{result['queries_per_request']:>10.1f}"
+                f"{result['sql_ms_per_request']:>10.2f}{result.get('template_ms_per_request', 0.0):>10.2f}"
+                f"{result['errors']:>8}"
+            )
+            if 'cpu_ms_per_request' in result:
+                self.stdout.write(f"{'':<16}cpu ms per request: {result['cpu_ms_per_request']:.2f}")
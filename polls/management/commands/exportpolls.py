@@ -0,0 +1,36 @@
+"""Export questions, choices and votes as JSONL or CSV."""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.shards import is_sharded
+from polls.transfer import Progress, write_csv, write_jsonl
+
+
+class Command(BaseCommand):
+    """Stream every question, choice and vote to a file."""
+
+    help = 'Export questions, choices and votes as JSONL (one file) or CSV (one file per model).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+        parser.add_argument('--output', default='-',
+                            help='JSONL file, "-" for stdout, or the directory of the CSV files.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if is_sharded():
+            raise CommandError('exportpolls only reads the votes of the default database, not the vote shards.')
+        progress = Progress(self.stderr.write)
+        output = options['output']
+        if options['format'] == 'csv':
+            if output == '-':
+                raise CommandError('CSV export needs an --output directory.')
+            write_csv(output, progress, options['chunk_size'], options['database'])
+        elif output == '-':
+            write_jsonl(sys.stdout, progress, options['chunk_size'], options['database'])
+        else:
+            with open(output, 'w') as stream:
+                write_jsonl(stream, progress, options['chunk_size'], options['database'])
+        self.stderr.write(self.style.SUCCESS(f'Exported {progress.summary()}.'))
@@ -0,0 +1,18 @@
+"""Drain the write-behind vote buffer."""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.writebehind import get_vote_buffer
+
+
+class Command(BaseCommand):
+    """Write every buffered vote to the database."""
+
+    help = 'Write the votes in the write-behind buffer to the database.'
+
+    def handle(self, *args, **options):
+        try:
+            applied = get_vote_buffer().flush()
+        except ImproperlyConfigured as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} vote(s).'))
@@ -0,0 +1,42 @@
+"""Import questions, choices and votes from exportpolls files."""
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from polls.shards import is_sharded
+from polls.transfer import Loader, Progress, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    """Load an exportpolls JSONL file or CSV directory in bulk_create batches."""
+
+    help = 'Import questions, choices and votes written by exportpolls.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file, "-" for stdin, or the directory of the CSV files.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='Default: csv for a directory, jsonl otherwise.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create and transaction.')
+        parser.add_argument('--ignore-conflicts', action='store_true', help='Skip rows whose id already exists.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if is_sharded():
+            raise CommandError('importpolls only writes the votes of the default database, not the vote shards.')
+        path = options['path']
+        data_format = options['format'] or ('csv' if os.path.isdir(path) else 'jsonl')
+        progress = Progress(self.stderr.write)
+        loader = Loader(progress, options['batch_size'], options['ignore_conflicts'], options['database'])
+        try:
+            if data_format == 'csv':
+                read_csv(path, loader)
+            elif path == '-':
+                read_jsonl(sys.stdin, loader)
+            else:
+                with open(path) as stream:
+                    read_jsonl(stream, loader)
+        except (IntegrityError, ValueError) as error:
+            raise CommandError(f'Import stopped after {progress.summary()}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Imported {progress.summary()}.'))
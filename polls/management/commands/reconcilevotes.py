@@ -0,0 +1,33 @@
+"""Compare the choice tallies with the Vote table and fix the drift."""
+from django.core.management.base import BaseCommand
+
+from polls.reconcile import reconcile
+from polls.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """Recount Choice.votes from the votes with one grouped aggregate."""
+
+    help = 'Report and fix choice tallies that do not match the Vote table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--question', type=int, action='append', dest='questions',
+                            help='Only check this question id (can be repeated).')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the mismatches.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Choices compared and fixed at a time.')
+        parser.add_argument('--rebuild-rollups', action='store_true',
+                            help='Also recompute the hourly rollups from the vote times.')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile(options['questions'], options['dry_run'], options['chunk_size'])
+        for choice_id, question_id, stored, counted in mismatches:
+            self.stdout.write(f'choice#{choice_id} of poll#{question_id}: stored {stored}, counted {counted}')
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All tallies match.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} tally(ies) would be fixed.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} tally(ies).'))
+        if options['rebuild_rollups'] and not options['dry_run']:
+            written = rebuild_rollups(options['questions'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} hourly rollup(s).'))
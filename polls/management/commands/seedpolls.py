@@ -0,0 +1,228 @@
+"""Generate a large, reproducible polls dataset."""
+import datetime
+import itertools
+import random
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from polls.cache import bump_content_version
+from polls.models import Choice, Question, Vote, VoteRollup
+from polls.shards import is_sharded
+
+STATUSES = (Question.OPEN, Question.CLOSED, Question.SCHEDULED)
+
+
+def zipf_weights(n, exponent):
+    """Return the Zipf weights 1/rank**exponent of ranks 1..n."""
+    return [1 / rank ** exponent for rank in range(1, n + 1)]
+
+
+def allocate(total, weights, cap):
+    """Split total into integer shares proportional to weights, each at most cap.
+
+    Shares taken from capped entries go to the others, so the sum is total
+    unless every entry is capped.
+
+    Args:
+        total : the number to split
+        weights : the weight of each entry, largest first
+        cap : the maximum share of an entry
+
+    Returns:
+        list : the share of each entry
+    """
+    counts = [0] * len(weights)
+    remaining = min(total, cap * len(weights))
+    while remaining:
+        active = [i for i, count in enumerate(counts) if count < cap]
+        weight = sum(weights[i] for i in active)
+        given = 0
+        for i in active:
+            share = min(cap - counts[i], max(1, int(remaining * weights[i] / weight)), remaining - given)
+            counts[i] += share
+            given += share
+            if given == remaining:
+                break
+        remaining -= given
+    return counts
+
+
+def question_dates(rng, status, now):
+    """Return a (pub_date, end_date) with the given status at now."""
+    day = datetime.timedelta(days=1)
+    if status == Question.OPEN:
+        pub_date = now - rng.uniform(1, 30) * day
+        return pub_date, now + rng.uniform(1, 60) * day
+    if status == Question.CLOSED:
+        pub_date = now - rng.uniform(31, 365) * day
+        return pub_date, pub_date + rng.uniform(1, 30) * day
+    pub_date = now + rng.uniform(1, 30) * day
+    return pub_date, pub_date + rng.uniform(7, 60) * day
+
+
+class Command(BaseCommand):
+    """Create users, questions, choices and skewed votes with batched inserts."""
+
+    help = 'Generate users, questions, choices and Zipf-distributed votes from a fixed seed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--choices', type=int, default=4, help='choices per question')
+        parser.add_argument('--votes', type=int, default=100000,
+                            help='votes to cast, at most one per user and published question')
+        parser.add_argument('--status-mix', default='70,20,10', metavar='OPEN,CLOSED,SCHEDULED',
+                            help='relative share of open, closed and scheduled questions')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='skew of the votes over questions and choices (0 is uniform)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--username-prefix', default='seed')
+        parser.add_argument('--password', default='seedpolls', help='password of every generated user')
+
+    def handle(self, *args, **options):
+        if is_sharded():
+            raise CommandError('seedpolls only writes the votes of the default database, not the vote shards.')
+        try:
+            mix = [float(share) for share in options['status_mix'].split(',')]
+        except ValueError:
+            mix = []
+        if len(mix) != 3 or min(mix) < 0 or not sum(mix):
+            raise CommandError('--status-mix needs three non-negative shares, e.g. 70,20,10.')
+        User = get_user_model()
+        if User.objects.filter(username__startswith=options['username_prefix']).exists():
+            raise CommandError(f"Users named {options['username_prefix']}* exist; choose another --username-prefix.")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options)
+            questions = self.create_questions(options, mix)
+            choices = self.create_choices(options, questions)
+            votes, _ = self.create_votes(options, questions, choices, user_ids)
+        # Bulk inserts send no signals: refresh the cached template fragments.
+        bump_content_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(user_ids)} users, {len(questions)} questions, '
+            f'{sum(len(ids) for ids in choices.values())} choices and {votes} votes '
+            f'in {time.perf_counter() - self.started:.1f}s.'
+        ))
+
+    def report(self, message):
+        """Write a progress line with the elapsed time."""
+        self.stderr.write(f'[{time.perf_counter() - self.started:6.1f}s] {message}')
+
+    def create_users(self, options):
+        """Create the users sharing one password hash and return their ids."""
+        User = get_user_model()
+        password = make_password(options['password'])
+        prefix = options['username_prefix']
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{i}', password=password) for i in range(options['users'])),
+            batch_size=self.batch_size,
+        )
+        user_ids = list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+        self.report(f'{len(user_ids)} users')
+        return user_ids
+
+    def create_questions(self, options, mix):
+        """Create the questions with the status mix and return them."""
+        now = timezone.now()
+        last_id = Question.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        statuses = self.rng.choices(STATUSES, weights=mix, k=options['questions'])
+        questions = []
+        for i, status in enumerate(statuses):
+            pub_date, end_date = question_dates(self.rng, status, now)
+            questions.append(Question(question_text=f'Seed question {i}?', pub_date=pub_date, end_date=end_date))
+        Question.objects.bulk_create(questions, batch_size=self.batch_size)
+        questions = list(Question.objects.filter(id__gt=last_id).order_by('id'))
+        self.report(f'{len(questions)} questions')
+        return questions
+
+    def create_choices(self, options, questions):
+        """Create the choices and return question id -> choice ids."""
+        last_id = Choice.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        Choice.objects.bulk_create(
+            (Choice(question_id=question.id, choice_text=f'Choice {j}')
+             for question in questions for j in range(options['choices'])),
+            batch_size=self.batch_size,
+        )
+        choices = {}
+        for choice_id, question_id in Choice.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'question_id'):
+            choices.setdefault(question_id, []).append(choice_id)
+        self.report(f'{sum(len(ids) for ids in choices.values())} choices')
+        return choices
+
+    def insert_rows(self, model, fields, rows):
+        """Insert value tuples with executemany, batch_size rows at a time.
+
+        Used for the votes and rollups: building a model instance per row
+        would cost more than the inserts themselves.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field) for field in fields)
+        sql = f'INSERT INTO {table} ({columns}) VALUES ({", ".join(["%s"] * len(fields))})'
+        inserted = 0
+        with connection.cursor() as cursor:
+            while True:
+                batch = list(itertools.islice(rows, self.batch_size))
+                if not batch:
+                    return inserted
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+                if len(batch) == self.batch_size and inserted % (self.batch_size * 100) == 0:
+                    self.report(f'{inserted} {model._meta.verbose_name_plural}')
+
+    def create_votes(self, options, questions, choices, user_ids):
+        """Cast the votes, Zipf-skewed over questions and choices, and set the tallies and rollups.
+
+        Returns:
+            tuple : the number of votes and of hourly rollups created
+        """
+        now = timezone.now()
+        published = [question for question in questions if question.pub_date <= now and question.id in choices]
+        # Popularity ranks are shuffled so they do not follow the ids.
+        self.rng.shuffle(published)
+        counts = allocate(options['votes'], zipf_weights(len(published), options['zipf']), len(user_ids))
+        choice_weights = zipf_weights(options['choices'], options['zipf'])
+        tallies, rollups = Counter(), Counter()
+        hour = datetime.timedelta(hours=1)
+        epoch = timezone.make_naive(datetime.datetime.fromtimestamp(0, datetime.timezone.utc), connection.timezone)
+
+        def votes():
+            for question, count in zip(published, counts):
+                # Sorted voters and times keep the index inserts mostly sequential.
+                voters = sorted(self.rng.sample(user_ids, count))
+                question_choices = choices[question.id]
+                picks = self.rng.choices(question_choices, weights=choice_weights[:len(question_choices)], k=count)
+                span = (min(question.end_date, now) - question.pub_date).total_seconds()
+                offsets = sorted(self.rng.random() * span for _ in range(count))
+                # Add the offsets to the naive database time and count POSIX
+                # hours rather than adapting and truncating a datetime per vote.
+                start = question.pub_date.timestamp()
+                base = timezone.make_naive(question.pub_date, connection.timezone)
+                hours = [int((start + offset) // 3600) for offset in offsets]
+                tallies.update(picks)
+                rollups.update(zip(itertools.repeat(question.id), picks, hours))
+                for user_id, choice_id, offset in zip(voters, picks, offsets):
+                    yield question.id, choice_id, user_id, str(base + datetime.timedelta(seconds=offset))
+
+        created = self.insert_rows(Vote, ['question_id', 'choice_id', 'user_id', 'created'], votes())
+        self.report(f'{created} votes')
+        Choice.objects.bulk_update(
+            [Choice(id=choice_id, votes=votes) for choice_id, votes in tallies.items()],
+            ['votes'], batch_size=self.batch_size,
+        )
+        rollup_count = self.insert_rows(VoteRollup, ['question_id', 'choice_id', 'hour', 'votes'], (
+            (question_id, choice_id, str(epoch + number * hour), votes)
+            for (question_id, choice_id, number), votes in rollups.items()
+        ))
+        self.report(f'{rollup_count} hourly rollups')
+        return created, rollup_count
@@ -0,0 +1,33 @@
+"""Copy the primary SQLite database to the read replicas."""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from mysite.routers import sync_replica
+
+
+class Command(BaseCommand):
+    """Copy the default database over each replica, once or every --interval seconds."""
+
+    help = 'Copy the primary SQLite database to the replicas of settings.DATABASE_REPLICAS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='keep copying every N seconds until interrupted')
+
+    def handle(self, *args, **options):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('No replicas configured; set SQLITE_REPLICAS.')
+        if any(connections[alias].vendor != 'sqlite' for alias in [DEFAULT_DB_ALIAS, *replicas]):
+            raise CommandError('syncreplicas copies SQLite files; use the replication of your database server.')
+        while True:
+            started = time.perf_counter()
+            for alias in replicas:
+                sync_replica(alias)
+            self.stdout.write(f'Copied to {len(replicas)} replica(s) in {time.perf_counter() - started:.2f}s.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:13
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """Keep only the latest vote of each (user, question) and recount tallies."""
+    Vote = apps.get_model('polls', 'Vote')
+    Choice = apps.get_model('polls', 'Choice')
+    db = schema_editor.connection.alias
+    duplicates = (
+        Vote.objects.using(db).values('user', 'question')
+        .annotate(latest=Max('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        Vote.objects.using(db).filter(
+            user=row['user'], question=row['question'], id__lt=row['latest']
+        ).delete()
+        for choice in Choice.objects.using(db).filter(question=row['question']):
+            choice.votes = Vote.objects.using(db).filter(choice=choice).count()
+            choice.save(update_fields=['votes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_user_question_vote'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_question_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='results_modified',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='results modified'),
+        ),
+    ]
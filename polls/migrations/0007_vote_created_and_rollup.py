@@ -0,0 +1,52 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Count
+
+
+def backfill_rollups(apps, schema_editor):
+    """Count the existing votes in the current hour, so rollups add up to the tallies."""
+    Vote = apps.get_model('polls', 'Vote')
+    VoteRollup = apps.get_model('polls', 'VoteRollup')
+    hour = django.utils.timezone.now().replace(minute=0, second=0, microsecond=0)
+    rows = Vote.objects.order_by().values('question_id', 'choice_id').annotate(total=Count('id'))
+    VoteRollup.objects.bulk_create([
+        VoteRollup(question_id=row['question_id'], choice_id=row['choice_id'], hour=hour, votes=row['total'])
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_question_results_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='date voted'),
+        ),
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('votes', models.IntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='voterollup',
+            index=models.Index(fields=['question', 'hour'], name='polls_rollup_question_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='voterollup',
+            constraint=models.UniqueConstraint(fields=('choice', 'hour'), name='unique_choice_hour_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_vote_created_and_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStamp',
+            fields=[
+                ('question_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('modified', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShardTally',
+            fields=[
+                ('choice_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('question_id', models.IntegerField(db_index=True)),
+                ('votes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShardVote',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_id', models.IntegerField()),
+                ('choice_id', models.IntegerField(db_index=True)),
+                ('user_id', models.IntegerField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='date voted')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shardvote',
+            constraint=models.UniqueConstraint(fields=('user_id', 'question_id'), name='unique_user_question_shard_vote'),
+        ),
+    ]
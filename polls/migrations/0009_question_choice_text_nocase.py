@@ -0,0 +1,36 @@
+from django.db import migrations
+
+INDEXES = [
+    ('polls_question_text_nocase', 'polls_question', 'question_text'),
+    ('polls_choice_text_nocase', 'polls_choice', 'choice_text'),
+]
+
+
+def create_nocase_indexes(apps, schema_editor):
+    """Index the texts for the admin's case-insensitive prefix searches.
+
+    SQLite's LIKE ignores case, so it can only use an index in the NOCASE
+    collation. Other databases keep their plain table scan.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)')
+
+
+def drop_nocase_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_shard_models'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_nocase_indexes, drop_nocase_indexes),
+    ]
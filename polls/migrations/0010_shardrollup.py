@@ -0,0 +1,31 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_question_choice_text_nocase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_id', models.IntegerField()),
+                ('choice_id', models.IntegerField()),
+                ('hour', models.DateTimeField()),
+                ('votes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='shardrollup',
+            index=models.Index(fields=['question_id', 'hour'], name='polls_shardrollup_q_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shardrollup',
+            constraint=models.UniqueConstraint(fields=('choice_id', 'hour'), name='unique_choice_hour_shard_rollup'),
+        ),
+    ]
@@ -2,10 +2,57 @@
 import datetime
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Case, CharField, F, Value, When
 from django.utils import timezone
 
 
+class QuestionQuerySet(models.QuerySet):
+    """QuerySet for Question with the poll status computed in SQL."""
+
+    def with_status(self, now=None):
+        """Annotate each question with status 'scheduled', 'open' or 'closed'.
+
+        Args:
+            now : the timestamp to compare with, default is timezone.now()
+        """
+        now = now or timezone.now()
+        return self.annotate(status=Case(
+            When(pub_date__gt=now, then=Value(Question.SCHEDULED)),
+            When(end_date__lte=now, then=Value(Question.CLOSED)),
+            default=Value(Question.OPEN),
+            output_field=CharField(),
+        ))
+
+    def scheduled(self, now=None):
+        """Return the questions that are not published yet."""
+        return self.filter(pub_date__gt=now or timezone.now())
+
+    def open(self, now=None):
+        """Return the questions that can be voted on."""
+        now = now or timezone.now()
+        return self.filter(pub_date__lte=now, end_date__gt=now)
+
+    def closed(self, now=None):
+        """Return the published questions whose end_date passed."""
+        now = now or timezone.now()
+        return self.filter(pub_date__lte=now, end_date__lte=now)
+
+    def bump_version(self):
+        """Increment the results version of the questions and stamp the change time."""
+        return self.update(version=F('version') + 1, results_modified=timezone.now())
+
+    def lock_for_write(self):
+        """Lock the questions with an update that changes nothing.
+
+        SQLite starts transactions deferred: one that reads before writing
+        fails with "database is locked" when upgrading its read lock, instead
+        of waiting for busy_timeout. Writing first takes the write lock at the
+        start, and other databases lock the question rows.
+        """
+        return self.update(version=F('version'))
+
+
 class Question(models.Model):
     """Question Model.
 
@@ -16,6 +63,22 @@ class Question(models.Model):
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published')
     end_date = models.DateTimeField('date closed')
+    version = models.PositiveIntegerField(default=0, editable=False)
+    results_modified = models.DateTimeField('results modified', null=True, editable=False)
+
+    SCHEDULED = 'scheduled'
+    OPEN = 'open'
+    CLOSED = 'closed'
+
+    RESULTS_FIELDS = ('version', 'results_modified')
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pub_date', 'id'], name='polls_question_pub_id_idx'),
+            models.Index(fields=['end_date', 'pub_date'], name='polls_question_end_pub_idx'),
+        ]
 
     def __str__(self):
         """Return a string represent of the question.
@@ -25,6 +88,19 @@ class Question(models.Model):
         """
         return self.question_text
 
+    def save(self, *args, **kwargs):
+        """Save the question, without its results version when updating it.
+
+        The version and results_modified only change with bump_version() in
+        the database, so saving a stale instance cannot move them back.
+        """
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.RESULTS_FIELDS]
+        super().save(*args, **kwargs)
+
     def was_published_recently(self):
         """Return true if pub_date passes in 24 hrs.
 
@@ -38,37 +114,47 @@ class Question(models.Model):
     # was_published_recently.boolean = True
     # was_published_recently.short_description = 'Published recently?'
 
-    def was_closed(self):
+    def was_closed(self, now=None):
         """Return true if end_date passed.
 
+        Args:
+            now : the timestamp to compare with, default is timezone.now()
+
         Returns:
             bool : true if question was closed.
         """
-        now = timezone.now()
+        now = now or timezone.now()
         return self.end_date <= now
 
     was_closed.boolean = True
     was_closed.short_description = 'Closed?'
 
-    def is_published(self):
+    def is_published(self, now=None):
         """Return true if pub_date passed.
 
+        Args:
+            now : the timestamp to compare with, default is timezone.now()
+
         Returns:
             bool : true if question was published.
         """
-        now = timezone.now()
+        now = now or timezone.now()
         return self.pub_date <= now
 
     is_published.boolean = True
     is_published.short_description = 'Published?'
 
-    def can_vote(self):
+    def can_vote(self, now=None):
         """Return true if pub_date passed and end_date did not pass yet.
 
+        Args:
+            now : the timestamp to compare with, default is timezone.now()
+
         Returns:
             bool : true if question is still active.
         """
-        return self.is_published() and not self.was_closed()
+        now = now or timezone.now()
+        return self.is_published(now) and not self.was_closed(now)
 
     def was_closed_recently(self):
         """Return true if end_date passes in 24 hrs.
@@ -84,17 +170,34 @@ class Question(models.Model):
     was_closed_recently.short_description = 'Closed recently?'
 
     def update_question_vote(self, user, choice):
-        """Add a vote and Update number of votes for each choice base on Vote item"""
-        try:
-            previous_vote = user.vote_set.get(question=self)
-            previous_vote.choice = choice
-            previous_vote.save()
-        except (KeyError, Vote.DoesNotExist):
-            Vote.objects.create(question=self, choice=choice, user=user)
+        """Add or switch the user's vote and apply the change to the tallies.
 
-        for choice in self.choice_set.all():
-            choice.update_vote()
-            choice.save()
+        Only the affected choices are touched: +1 for the new choice and -1
+        for the previously chosen one. The counters are updated in the
+        database with F() expressions inside one transaction, so the number
+        of queries is constant and concurrent voters never overwrite each
+        other's counts. The results version of the question is incremented
+        in the same transaction, unless the vote did not change.
+
+        Args:
+            user : Current user
+            choice : the selected choice of this question
+        """
+        with transaction.atomic():
+            Question.objects.filter(pk=self.pk).lock_for_write()
+            previous_choice_id = Vote.objects.select_for_update().filter(
+                question=self, user=user
+            ).values_list('choice_id', flat=True).first()
+            if previous_choice_id == choice.id:
+                return
+            Question.objects.filter(pk=self.pk).bump_version()
+            Vote.objects.upsert(question=self, choice=choice, user=user)
+            deltas = {(self.id, choice.id): 1}
+            if previous_choice_id is not None:
+                Choice.objects.filter(pk=previous_choice_id).update(votes=F('votes') - 1)
+                deltas[(self.id, previous_choice_id)] = -1
+            Choice.objects.filter(pk=choice.id).update(votes=F('votes') + 1)
+            VoteRollup.objects.add(deltas)
 
     def voted_status(self, user):
         """Return a string represent of the user vote status.
@@ -131,7 +234,8 @@ class Choice(models.Model):
     votes = models.IntegerField(default=0)
 
     def update_vote(self):
-        self.votes = len(self.vote_set.all())
+        """Recount the votes of this choice from the Vote table."""
+        self.votes = self.vote_set.count()
 
     def __str__(self):
         """Return a string represent of the choice.
@@ -142,13 +246,176 @@ class Choice(models.Model):
         return self.choice_text
 
 
+class VoteQuerySet(models.QuerySet):
+    """QuerySet for Vote with a create-or-switch operation."""
+
+    def upsert(self, question, choice, user):
+        """Create the user's vote for question, or switch it to choice.
+
+        On SQLite and PostgreSQL this is a single INSERT ... ON CONFLICT
+        statement backed by the (user, question) unique constraint. The
+        database is the one of .using(), else the one the routers pick to
+        save a vote on question.
+
+        Args:
+            question : the question to vote on
+            choice : the selected choice
+            user : Current user
+        """
+        using = self._db or router.db_for_write(self.model, instance=self.model(question_id=question.id))
+        connection = connections[using]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.using(using).update_or_create(
+                question_id=question.id, user_id=user.id, defaults={'choice_id': choice.id})
+            return
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (question_id, choice_id, user_id, created) VALUES (%s, %s, %s, %s) '
+                'ON CONFLICT (user_id, question_id) DO UPDATE SET choice_id = excluded.choice_id',
+                [question.id, choice.id, user.id, connection.ops.adapt_datetimefield_value(timezone.now())],
+            )
+
+
 class Vote(models.Model):
     """Vote Model.
 
     Args:
-        models : Vote details (question, choice, user)
+        models : Vote details (question, choice, user, created)
     """
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    created = models.DateTimeField('date voted', default=timezone.now, db_index=True, editable=False)
+
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='unique_user_question_vote'),
+        ]
+
+
+def truncate_hour(moment):
+    """Return moment truncated to the start of its UTC hour."""
+    return moment.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class VoteRollupQuerySet(models.QuerySet):
+    """QuerySet for VoteRollup with an incremental add."""
+
+    def add(self, deltas, moment=None):
+        """Add vote count changes to the hour of moment.
+
+        On SQLite and PostgreSQL this is a single INSERT ... ON CONFLICT
+        statement backed by the (choice, hour) unique constraint. The
+        database is the one of .using(), else the one the routers pick to
+        save a rollup of the first question, so the deltas of a sharded
+        rollup must share one shard.
+
+        Args:
+            deltas : (question id, choice id) -> change of the choice's vote count
+            moment : when the votes changed, default is timezone.now()
+        """
+        hour = truncate_hour(moment or timezone.now())
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        first_question_id, _ = next(iter(deltas))
+        using = self._db or router.db_for_write(self.model, instance=self.model(question_id=first_question_id))
+        connection = connections[using]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            rollups = self.using(using)
+            for (question_id, choice_id), delta in deltas.items():
+                if not rollups.filter(choice_id=choice_id, hour=hour).update(votes=F('votes') + delta):
+                    rollups.create(question_id=question_id, choice_id=choice_id, hour=hour, votes=delta)
+            return
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        hour = connection.ops.adapt_datetimefield_value(hour)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (question_id, choice_id, hour, votes) VALUES '
+                + ', '.join(['(%s, %s, %s, %s)'] * len(deltas))
+                + f' ON CONFLICT (choice_id, hour) DO UPDATE SET votes = {table}.votes + excluded.votes',
+                [value for (question_id, choice_id), delta in deltas.items()
+                 for value in (question_id, choice_id, hour, delta)],
+            )
+
+
+class VoteRollup(models.Model):
+    """Net change of a choice's vote count during one hour.
+
+    Args:
+        models : VoteRollup details (question, choice, hour, votes)
+    """
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    votes = models.IntegerField(default=0)
+
+    objects = VoteRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'hour'], name='unique_choice_hour_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'hour'], name='polls_rollup_question_hour_idx'),
+        ]
+
+
+class ShardVote(models.Model):
+    """A vote kept in a vote shard, see polls/shards.py.
+
+    Same columns as Vote, but plain ids: foreign keys cannot point to the
+    questions, choices and users of the default database.
+    """
+
+    question_id = models.IntegerField()
+    choice_id = models.IntegerField(db_index=True)
+    user_id = models.IntegerField()
+    created = models.DateTimeField('date voted', default=timezone.now, editable=False)
+
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'question_id'], name='unique_user_question_shard_vote'),
+        ]
+
+
+class ShardTally(models.Model):
+    """Vote count of a choice kept in a vote shard, in place of Choice.votes."""
+
+    choice_id = models.IntegerField(primary_key=True)
+    question_id = models.IntegerField(db_index=True)
+    votes = models.IntegerField(default=0)
+
+
+class QuestionStamp(models.Model):
+    """Results version of a question kept in a vote shard, in place of Question.version."""
+
+    question_id = models.IntegerField(primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(null=True)
+
+
+class ShardRollup(models.Model):
+    """Hourly net change of a choice's vote count kept in a vote shard, in place of VoteRollup."""
+
+    question_id = models.IntegerField()
+    choice_id = models.IntegerField()
+    hour = models.DateTimeField()
+    votes = models.IntegerField(default=0)
+
+    objects = VoteRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice_id', 'hour'], name='unique_choice_hour_shard_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['question_id', 'hour'], name='polls_shardrollup_q_hour_idx'),
+        ]
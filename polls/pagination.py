@@ -0,0 +1,92 @@
+"""Keyset (cursor) pagination for questions ordered by newest first."""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(question):
+    """Return an opaque cursor pointing at question.
+
+    Args:
+        question : the question at the edge of a page
+
+    Returns:
+        String : urlsafe cursor of (pub_date, id)
+    """
+    raw = f'{question.pub_date.isoformat()}|{question.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (pub_date, id) of a cursor, or None if it is not valid."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        pub_date, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class KeysetPage:
+    """One page of questions with cursors to its neighbours.
+
+    Args:
+        object_list : the questions of the page, newest first
+        next_cursor : cursor of older questions or None
+        previous_cursor : cursor of newer questions or None
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+
+def paginate_questions(queryset, page_size, after=None, before=None):
+    """Return a page of queryset ordered by (-pub_date, -id).
+
+    The page is selected with a range condition on (pub_date, id) instead
+    of OFFSET, so deep pages cost the same as the first one.
+
+    Args:
+        queryset : the questions to paginate
+        page_size : number of questions per page
+        after : cursor, return the questions older than it
+        before : cursor, return the questions newer than it
+
+    Returns:
+        KeysetPage : the requested page (the first page for invalid cursors)
+    """
+    after = decode_cursor(after) if after else None
+    before = decode_cursor(before) if before else None
+    if after:
+        pub_date, pk = after
+        rows = list(queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+        ).order_by('-pub_date', '-id')[:page_size + 1])
+        has_next, has_previous = len(rows) > page_size, True
+        rows = rows[:page_size]
+    elif before:
+        pub_date, pk = before
+        rows = list(queryset.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+        ).order_by('pub_date', 'id')[:page_size + 1])
+        has_next, has_previous = True, len(rows) > page_size
+        rows = rows[:page_size][::-1]
+    else:
+        rows = list(queryset.order_by('-pub_date', '-id')[:page_size + 1])
+        has_next, has_previous = len(rows) > page_size, False
+        rows = rows[:page_size]
+    if not rows:
+        return KeysetPage(rows)
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if has_next else None,
+        previous_cursor=encode_cursor(rows[0]) if has_previous else None,
+    )
@@ -0,0 +1,136 @@
+"""Detect and repair drift of the denormalized Choice.votes counters.
+
+With vote shards, the votes and the tallies of each shard are compared
+instead, with one GROUP BY per shard.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Choice, Question, ShardTally, ShardVote, Vote
+from .shards import bump_stamp, get_tallies, group_by_shard, is_sharded, shard_for
+
+
+def count_votes(question_ids=None):
+    """Return {choice_id: votes} counted from the Vote table with one GROUP BY.
+
+    Args:
+        question_ids : only count the votes of these questions, default is all
+    """
+    if is_sharded():
+        return count_shard_votes(question_ids)
+    votes = Vote.objects.all()
+    if question_ids:
+        votes = votes.filter(question_id__in=question_ids)
+    return dict(votes.order_by().values('choice_id').annotate(total=Count('id')).values_list('choice_id', 'total'))
+
+
+def count_shard_votes(question_ids=None):
+    """Return {choice_id: votes} counted from the ShardVote tables with one GROUP BY per shard."""
+    if question_ids:
+        groups = group_by_shard(question_ids)
+    else:
+        groups = {alias: None for alias in settings.POLLS_VOTE_SHARDS}
+    counted = {}
+    for alias, ids in groups.items():
+        votes = ShardVote.objects.using(alias).all()
+        if ids is not None:
+            votes = votes.filter(question_id__in=ids)
+        counted.update(votes.order_by().values('choice_id').annotate(total=Count('id')).values_list(
+            'choice_id', 'total'))
+    return counted
+
+
+def find_drift(question_ids=None, chunk_size=2000):
+    """Yield (choice_id, question_id, stored, counted) for each choice whose tally is wrong.
+
+    The stored tallies are read chunk_size choices at a time, in id order.
+    """
+    counted = count_votes(question_ids)
+    choices = Choice.objects.order_by('id')
+    if question_ids:
+        choices = choices.filter(question_id__in=question_ids)
+    last_id = 0
+    while True:
+        chunk = list(choices.filter(id__gt=last_id).values_list('id', 'question_id', 'votes')[:chunk_size])
+        if not chunk:
+            return
+        if is_sharded():
+            tallies = get_tallies({question_id for _, question_id, _ in chunk})
+            chunk = [(choice_id, question_id, tallies.get(choice_id, 0)) for choice_id, question_id, _ in chunk]
+        for choice_id, question_id, stored in chunk:
+            if stored != counted.get(choice_id, 0):
+                yield choice_id, question_id, stored, counted.get(choice_id, 0)
+        last_id = chunk[-1][0]
+
+
+def fix_tallies(mismatches):
+    """Recount the votes of the mismatched choices in one UPDATE and bump their questions' version.
+
+    The counts are computed inside the UPDATE, so votes cast since the drift
+    was found are not lost.
+    """
+    if is_sharded():
+        fix_shard_tallies(mismatches)
+        return
+    recount = Vote.objects.filter(choice=OuterRef('pk')).order_by().values('choice').annotate(total=Count('id'))
+    with transaction.atomic():
+        Choice.objects.filter(pk__in=[mismatch[0] for mismatch in mismatches]).update(
+            votes=Coalesce(Subquery(recount.values('total')), 0)
+        )
+        Question.objects.filter(pk__in={mismatch[1] for mismatch in mismatches}).bump_version()
+
+
+def fix_shard_tallies(mismatches):
+    """Recount the votes of the mismatched choices in their shards and bump their questions' stamp.
+
+    Each shard is fixed in one transaction that writes the stamps first, so
+    SQLite holds the shard's write lock while the votes are counted. The
+    existing tallies are recounted in one UPDATE, like fix_tallies(), and
+    the missing ones are counted with one GROUP BY and bulk created.
+    """
+    groups = defaultdict(dict)
+    for choice_id, question_id, _, _ in mismatches:
+        groups[shard_for(question_id)][choice_id] = question_id
+    for alias, questions in groups.items():
+        tallies = ShardTally.objects.using(alias)
+        votes = ShardVote.objects.using(alias).order_by()
+        recount = votes.filter(choice_id=OuterRef('pk')).values('choice_id').annotate(total=Count('id'))
+        with transaction.atomic(using=alias):
+            for question_id in set(questions.values()):
+                bump_stamp(question_id)
+            tallies.filter(pk__in=questions).update(votes=Coalesce(Subquery(recount.values('total')), 0))
+            missing = set(questions) - set(tallies.filter(pk__in=questions).values_list('pk', flat=True))
+            if missing:
+                counted = dict(votes.filter(choice_id__in=missing).values('choice_id').annotate(
+                    total=Count('id')).values_list('choice_id', 'total'))
+                tallies.bulk_create([
+                    ShardTally(choice_id=choice_id, question_id=questions[choice_id], votes=counted.get(choice_id, 0))
+                    for choice_id in missing
+                ])
+
+
+def reconcile(question_ids=None, dry_run=False, chunk_size=2000):
+    """Find the wrong tallies and fix them chunk by chunk.
+
+    Args:
+        question_ids : only check the choices of these questions, default is all
+        dry_run : only report the drift
+        chunk_size : choices read and fixed at a time
+
+    Returns:
+        list : the (choice_id, question_id, stored, counted) mismatches
+    """
+    mismatches, pending = [], []
+    for mismatch in find_drift(question_ids, chunk_size):
+        mismatches.append(mismatch)
+        pending.append(mismatch)
+        if len(pending) >= chunk_size and not dry_run:
+            fix_tallies(pending)
+            pending = []
+    if pending and not dry_run:
+        fix_tallies(pending)
+    return mismatches
@@ -0,0 +1,197 @@
+"""Vote storage sharded by question across several databases.
+
+With settings.POLLS_VOTE_SHARDS set, the votes, the choice tallies, the
+hourly rollups and the results version of a question live in the shard of
+its id (ShardVote, ShardTally, ShardRollup and QuestionStamp) instead of
+Vote, Choice.votes, VoteRollup and Question.version in the default database. A vote only writes to its
+shard, so on SQLite votes on questions of different shards commit in
+parallel instead of queueing behind one lock.
+
+Reads of one question go to its shard; reads of several questions (user
+ballots, bulk results, reconciliation) fan out with one query per shard.
+The helpers that apply shard data to questions and choices do nothing
+when sharding is off, so callers use them unconditionally.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import QuestionStamp, ShardRollup, ShardTally, ShardVote
+
+SHARD_MODELS = {'shardvote', 'shardtally', 'shardrollup', 'questionstamp'}
+
+
+def is_sharded():
+    """Return true if the votes are stored in shards."""
+    return bool(settings.POLLS_VOTE_SHARDS)
+
+
+def shard_for(question_id):
+    """Return the database alias of the shard of question_id."""
+    shards = settings.POLLS_VOTE_SHARDS
+    return shards[question_id % len(shards)]
+
+
+def group_by_shard(question_ids):
+    """Return {alias: [question_id, ...]} of the shards holding question_ids."""
+    groups = defaultdict(list)
+    for question_id in question_ids:
+        groups[shard_for(question_id)].append(question_id)
+    return groups
+
+
+class VoteShardRouter:
+    """Keep the shard models in the shards, and everything else out of them.
+
+    Queries on the shard models pick their shard with .using(shard_for(...));
+    saving an instance routes it by its question_id, and so do
+    ShardVote.objects.upsert() and ShardRollup.objects.add() without .using().
+    """
+
+    def db_for_read(self, model, **hints):
+        return self.db_for_write(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if model._meta.model_name in SHARD_MODELS and is_sharded() and instance is not None:
+            return shard_for(instance.question_id)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        sharded = app_label == 'polls' and model_name in SHARD_MODELS
+        if db in settings.POLLS_VOTE_SHARDS:
+            return sharded
+        if sharded:
+            return False
+        return None
+
+
+def bump_stamp(question_id):
+    """Increment the results version of question_id in its shard."""
+    alias = shard_for(question_id)
+    now = timezone.now()
+    stamps = QuestionStamp.objects.using(alias)
+    if not stamps.filter(pk=question_id).update(version=F('version') + 1, modified=now):
+        stamps.create(question_id=question_id, version=1, modified=now)
+
+
+def add_votes(alias, choice_id, question_id, delta):
+    """Add delta to the tally of choice_id in the shard alias."""
+    tallies = ShardTally.objects.using(alias)
+    if not tallies.filter(pk=choice_id).update(votes=F('votes') + delta):
+        tallies.create(choice_id=choice_id, question_id=question_id, votes=delta)
+
+
+def cast_vote(question, choice, user):
+    """Add or switch the user's vote in the shard of question, like Question.update_question_vote().
+
+    Args:
+        question : the question to vote on
+        choice : the selected choice of this question
+        user : Current user
+    """
+    alias = shard_for(question.id)
+    with transaction.atomic(using=alias):
+        # An update that changes nothing takes the shard's write lock first,
+        # see QuestionQuerySet.lock_for_write().
+        QuestionStamp.objects.using(alias).filter(pk=question.id).update(version=F('version'))
+        previous_choice_id = ShardVote.objects.using(alias).filter(
+            question_id=question.id, user_id=user.id
+        ).values_list('choice_id', flat=True).first()
+        if previous_choice_id == choice.id:
+            return
+        bump_stamp(question.id)
+        ShardVote.objects.upsert(question=question, choice=choice, user=user)
+        deltas = {(question.id, choice.id): 1}
+        if previous_choice_id is not None:
+            add_votes(alias, previous_choice_id, question.id, -1)
+            deltas[(question.id, previous_choice_id)] = -1
+        add_votes(alias, choice.id, question.id, 1)
+        ShardRollup.objects.add(deltas)
+
+
+def drop_votes(question_id, choice_id=None):
+    """Delete the votes, tallies and rollups of a deleted question, or of one of its deleted choices."""
+    alias = shard_for(question_id)
+    rows = [
+        model.objects.using(alias).filter(question_id=question_id) for model in (ShardVote, ShardTally, ShardRollup)
+    ]
+    with transaction.atomic(using=alias):
+        if choice_id is None:
+            QuestionStamp.objects.using(alias).filter(pk=question_id).delete()
+        else:
+            rows = [queryset.filter(choice_id=choice_id) for queryset in rows]
+            bump_stamp(question_id)
+        for queryset in rows:
+            queryset.delete()
+
+
+def get_user_choices(user_id, question_ids=None):
+    """Return {question_id: choice_id} of the user's votes, one query per shard.
+
+    Args:
+        user_id : the user's id
+        question_ids : only these questions, default is every shard
+    """
+    if question_ids is None:
+        groups = {alias: None for alias in settings.POLLS_VOTE_SHARDS}
+    else:
+        groups = group_by_shard(question_ids)
+    choices = {}
+    for alias, ids in groups.items():
+        votes = ShardVote.objects.using(alias).filter(user_id=user_id)
+        if ids is not None:
+            votes = votes.filter(question_id__in=ids)
+        choices.update(votes.values_list('question_id', 'choice_id'))
+    return choices
+
+
+def get_stamps(question_ids):
+    """Return {question_id: (version, modified)} of question_ids, (0, None) before any vote."""
+    stamps = dict.fromkeys(question_ids, (0, None))
+    for alias, ids in group_by_shard(question_ids).items():
+        stamps.update(
+            (question_id, (version, modified))
+            for question_id, version, modified in QuestionStamp.objects.using(alias).filter(
+                pk__in=ids
+            ).values_list('question_id', 'version', 'modified')
+        )
+    return stamps
+
+
+def get_tallies(question_ids):
+    """Return {choice_id: votes} of the choices of question_ids."""
+    tallies = {}
+    for alias, ids in group_by_shard(question_ids).items():
+        tallies.update(ShardTally.objects.using(alias).filter(question_id__in=ids).values_list('choice_id', 'votes'))
+    return tallies
+
+
+def get_vote_totals(question_ids):
+    """Return {question_id: votes} of the questions that have votes."""
+    totals = {}
+    for alias, ids in group_by_shard(question_ids).items():
+        totals.update(ShardTally.objects.using(alias).filter(question_id__in=ids).order_by().values(
+            'question_id').annotate(total=Sum('votes')).values_list('question_id', 'total'))
+    return totals
+
+
+def apply_stamps(questions):
+    """Set the version and results_modified of questions from their shards."""
+    if not is_sharded():
+        return
+    stamps = get_stamps([question.id for question in questions])
+    for question in questions:
+        question.version, question.results_modified = stamps[question.id]
+
+
+def apply_tallies(choices):
+    """Set the votes of choices from their shards."""
+    if not is_sharded():
+        return
+    tallies = get_tallies({choice.question_id for choice in choices})
+    for choice in choices:
+        choice.votes = tallies.get(choice.id, 0)
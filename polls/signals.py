@@ -0,0 +1,62 @@
+"""Signal receivers for polls app."""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_content_version
+from .models import Choice, Question
+from .shards import bump_stamp, drop_votes, is_sharded
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed_callback(sender, instance, **kwargs):
+    """Invalidate the cached results of the question, when a choice changes."""
+    if is_sharded():
+        bump_stamp(instance.question_id)
+    else:
+        Question.objects.filter(pk=instance.question_id).bump_version()
+    bump_content_version()
+
+
+@receiver(post_delete, sender=Choice)
+@receiver(post_delete, sender=Question)
+def votes_deleted_callback(sender, instance, **kwargs):
+    """Delete the shard votes of a deleted choice or question, which the database cannot cascade."""
+    if not is_sharded():
+        return
+    if sender is Choice:
+        drop_votes(instance.question_id, instance.id)
+    else:
+        drop_votes(instance.id)
+
+
+@receiver(pre_save, sender=Question)
+def question_text_changed_callback(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Invalidate the cached results of the question, when its text changes."""
+    if raw or instance._state.adding or (update_fields is not None and 'question_text' not in update_fields):
+        return
+    changed = Question.objects.filter(pk=instance.pk).exclude(question_text=instance.question_text)
+    if is_sharded():
+        if changed.exists():
+            bump_stamp(instance.pk)
+    else:
+        changed.bump_version()
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed_callback(sender, instance, **kwargs):
+    """Invalidate the cached template fragments, when a question changes."""
+    bump_content_version()
+
+
+@receiver(connection_created)
+def sqlite_connection_created_callback(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to a new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
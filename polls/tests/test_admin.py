@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.models import Choice, Question, Vote
+from polls.tests.utils import create_question
+
+
+class AdminTests(TestCase):
+    """Tests of the polls admin changelists."""
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(username="admin", password="@yoyo007")
+        self.client.force_login(self.admin)
+        self.add_voted_question('Past Question.')
+
+    def add_voted_question(self, question_text):
+        """Create a question with one choice voted by the admin."""
+        question = create_question(question_text=question_text, days=-5)
+        choice = Choice.objects.create(question=question, choice_text='choice_a')
+        question.update_question_vote(self.admin, choice)
+        return question
+
+    def assertQueriesDoNotGrow(self, url):
+        """Assert the page runs as many queries with more rows."""
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for n in range(5):
+            self.add_voted_question(f'Question {n}.')
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+
+    def test_question_changelist(self):
+        """Test the question changelist shows status and votes in constant queries"""
+        self.assertQueriesDoNotGrow(reverse('admin:polls_question_changelist'))
+        response = self.client.get(reverse('admin:polls_question_changelist') + '?q=Past')
+        self.assertContains(response, 'Past Question.')
+        self.assertContains(response, '?question=')
+
+    def test_choice_changelist(self):
+        """Test the choice changelist loads questions in the same query"""
+        self.assertQueriesDoNotGrow(reverse('admin:polls_choice_changelist'))
+
+    def test_vote_admin_is_read_only(self):
+        """Test votes can be listed and filtered but not changed"""
+        question = self.add_voted_question('Filtered Question.')
+        url = reverse('admin:polls_vote_changelist')
+        self.assertQueriesDoNotGrow(url)
+        response = self.client.get(url + f'?question={question.id}')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertEqual(self.client.get(reverse('admin:polls_vote_add')).status_code, 403)
+        vote = Vote.objects.filter(question=question).get()
+        response = self.client.post(reverse('admin:polls_vote_delete', args=(vote.id,)), {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(Vote.objects.filter(pk=vote.id).exists())
+
+    def test_delete_voted_question(self):
+        """Test a question with votes can be deleted, with its choices and votes"""
+        question = self.add_voted_question('Deleted Question.')
+        url = reverse('admin:polls_question_delete', args=(question.id,))
+        self.assertNotContains(self.client.get(url), "doesn't have permission to delete")
+        response = self.client.post(url, {'post': 'yes'})
+        self.assertRedirects(response, reverse('admin:polls_question_changelist'))
+        self.assertFalse(Question.objects.filter(pk=question.id).exists())
+        self.assertFalse(Vote.objects.filter(question_id=question.id).exists())
+
+    def test_prefix_search_uses_index(self):
+        """Test the case-insensitive prefix search of question texts can use an index on SQLite"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('COLLATE NOCASE indexes are SQLite only')
+        plan = Question.objects.filter(question_text__istartswith='Past').explain()
+        self.assertIn('polls_question_text_nocase', plan)
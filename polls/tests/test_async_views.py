@@ -0,0 +1,59 @@
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path
+
+from polls import async_views
+from polls.models import Choice
+from polls.tests.utils import create_question
+
+urlpatterns = [
+    path('polls/', include(([
+        path('', async_views.index, name='index'),
+        path('<int:question_id>/', async_views.detail, name='detail'),
+        path('<int:pk>/results/', async_views.results, name='results'),
+        path('<int:question_id>/vote/', async_views.vote, name='vote'),
+    ], 'polls'))),
+    path('accounts/', include('django.contrib.auth.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewsTests(TestCase):
+    """Tests of the async polls views."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+
+    async def test_index(self):
+        """Test the async index lists published questions"""
+        response = await self.async_client.get('/polls/')
+        self.assertContains(response, 'Past Question.')
+        self.assertContains(response, 'Login')
+
+    async def test_detail_requires_login(self):
+        """Test the async detail redirects to login when not logged in"""
+        response = await self.async_client.get(f'/polls/{self.question.id}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f'/accounts/login/?next=/polls/{self.question.id}/')
+
+    async def test_vote_and_results(self):
+        """Test the async vote redirects to the updated results"""
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(f'/polls/{self.question.id}/')
+        self.assertContains(response, 'Kitty have never voted for this question before')
+        response = await self.async_client.post(
+            f'/polls/{self.question.id}/vote/',
+            urlencode({'choice': self.choice.id}),
+            content_type='application/x-www-form-urlencoded',
+        )
+        self.assertEqual(response.url, f'/polls/{self.question.id}/results/')
+        response = await self.async_client.get(response.url)
+        self.assertContains(response, f'<th id="choice-{self.choice.id}-votes">1</th>', html=True)
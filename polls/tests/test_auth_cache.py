@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mysite.auth import user_cache_key
+from polls.tests.utils import create_question
+
+
+@override_settings(AUTH_USER_CACHE=True)
+class AuthUserCacheTests(TestCase):
+    """Tests of the cached authenticated user."""
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.client.login(username="Kitty", password="@yoyo007")
+
+    def user_queries(self, url):
+        """Request url and return the queries it ran on auth_user."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries if 'FROM "auth_user"' in query['sql']]
+
+    def test_user_read_from_cache(self):
+        """Only the first request of a session loads the user."""
+        url = reverse('polls:detail', args=(self.question.id,))
+        self.assertEqual(len(self.user_queries(url)), 1)
+        self.assertEqual(self.user_queries(url), [])
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, 'Kitty')
+
+    @override_settings(AUTH_USER_CACHE=False)
+    def test_disabled(self):
+        """Without AUTH_USER_CACHE every request loads the user."""
+        url = reverse('polls:index')
+        self.assertEqual(len(self.user_queries(url)), 1)
+        self.assertEqual(len(self.user_queries(url)), 1)
+
+    def test_logout(self):
+        """Logging out drops the cached user."""
+        self.client.get(reverse('polls:index'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.get(reverse('logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'Kitty')
+
+    def test_password_change_logs_out_other_sessions(self):
+        """Changing the password ends the sessions using the old one."""
+        self.client.get(reverse('polls:index'))
+        self.user.set_password('@new-password1')
+        self.user.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'Kitty')
+
+    def test_inactive_user(self):
+        """Deactivating a user ends its sessions."""
+        self.client.get(reverse('polls:index'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'Kitty')
+
+    def test_session_hash_checked_on_hit(self):
+        """A session with another password hash does not get the cached user."""
+        self.client.get(reverse('polls:index'))
+        session = self.client.session
+        session['_auth_user_hash'] = 'stale'
+        session.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'Kitty')
+
+    def test_permission_change(self):
+        """Granting a permission, directly or through a group, reloads the user."""
+        url = reverse('polls:index')
+        self.user_queries(url)
+        permission = Permission.objects.get(codename='change_question')
+        self.user.user_permissions.add(permission)
+        self.assertEqual(len(self.user_queries(url)), 1)
+        group = Group.objects.create(name='editors')
+        group.user_set.add(self.user)
+        self.assertEqual(len(self.user_queries(url)), 1)
+        group.permissions.add(Permission.objects.get(codename='delete_question'))
+        self.assertEqual(len(self.user_queries(url)), 1)
+        self.assertEqual(self.user_queries(url), [])
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from polls import bench_scenarios
+from polls.bench import compare_results, percentile
+
+
+def report(rps, p95_ms, queries):
+    """Return a benchpolls report with a single endpoint."""
+    return {'endpoints': {'index': {'rps': rps, 'p95_ms': p95_ms, 'queries_per_request': queries}}}
+
+
+class BenchPollsTests(SimpleTestCase):
+    """Tests of benchpolls report helpers."""
+
+    def test_percentile(self):
+        """Test percentile interpolates between the ranked values"""
+        values = [4, 1, 3, 2, 5]
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 100), 5)
+        self.assertEqual(percentile(values, 25), 2)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_compare_within_threshold(self):
+        """Test small changes are not reported as regressions"""
+        self.assertEqual(compare_results(report(100, 10, 3), report(95, 10.5, 3), threshold=10), [])
+
+    def test_compare_flags_regressions(self):
+        """Test slower, higher latency and extra queries are all reported"""
+        regressions = compare_results(report(100, 10, 3), report(50, 20, 4), threshold=10)
+        self.assertEqual(len(regressions), 3)
+
+    def test_failed_scenario_restores_settings(self):
+        """Test the vote shards of a scenario are switched off again when its run fails"""
+        class FailingBenchmark:
+            vote_shards = ['bench_votes0']
+
+            def run_mixed(self, workers, prepare=None):
+                prepare()
+                if settings.POLLS_VOTE_SHARDS:
+                    raise RuntimeError('client failed')
+                return {'vote': {}}
+
+        with self.assertRaises(RuntimeError):
+            bench_scenarios.run_vote_sharding(FailingBenchmark(), voters=2)
+        self.assertEqual(settings.POLLS_VOTE_SHARDS, [])
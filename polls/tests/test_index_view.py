@@ -1,6 +1,6 @@
 import datetime
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
@@ -71,3 +71,64 @@ class IndexTests(TestCase):
             response.context['latest_question_list'],
             ['<Question: Past question 2.>', '<Question: Past question 1.>']
         )
+
+    @override_settings(POLLS_INDEX_PAGE_SIZE=2)
+    def test_keyset_pagination(self):
+        """Test the index page is split into pages linked by cursors."""
+        for days in (-1, -2, -3):
+            create_question(question_text=f"Past question {-days}.", days=days)
+        response = self.client.get(reverse('polls:index'))
+        self.assertQuerysetEqual(
+            response.context['latest_question_list'],
+            ['<Question: Past question 1.>', '<Question: Past question 2.>']
+        )
+        self.assertIsNone(response.context['page'].previous_cursor)
+        response = self.client.get(reverse('polls:index'), {'after': response.context['page'].next_cursor})
+        self.assertQuerysetEqual(
+            response.context['latest_question_list'],
+            ['<Question: Past question 3.>']
+        )
+        self.assertIsNone(response.context['page'].next_cursor)
+        response = self.client.get(reverse('polls:index'), {'before': response.context['page'].previous_cursor})
+        self.assertQuerysetEqual(
+            response.context['latest_question_list'],
+            ['<Question: Past question 1.>', '<Question: Past question 2.>']
+        )
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor shows the first page."""
+        create_question(question_text="Past question.", days=-30)
+        response = self.client.get(reverse('polls:index'), {'after': 'not a cursor'})
+        self.assertQuerysetEqual(
+            response.context['latest_question_list'],
+            ['<Question: Past question.>']
+        )
+
+
+class FragmentCacheTests(TestCase):
+    """Tests of the cached question rows of the index page."""
+
+    def test_rows_are_cached_until_content_changes(self):
+        """Test a row is reused until a question is saved"""
+        question = create_question(question_text='Past question.', days=-30)
+        self.client.get(reverse('polls:index'))
+        Question.objects.filter(pk=question.pk).update(question_text='Renamed without signal.')
+        self.assertContains(self.client.get(reverse('polls:index')), 'Past question.')
+        question.question_text = 'Renamed.'
+        question.save()
+        self.assertContains(self.client.get(reverse('polls:index')), 'Renamed.')
+
+    def test_rows_vary_on_status(self):
+        """Test a closed question does not reuse the open row with its vote button"""
+        question = create_question(question_text='Past question.', days=-30)
+        self.assertContains(self.client.get(reverse('polls:index')), '<button>vote</button>', html=True)
+        Question.objects.filter(pk=question.pk).update(end_date=timezone.now())
+        self.assertNotContains(self.client.get(reverse('polls:index')), '<button>vote</button>', html=True)
+
+    @override_settings(POLLS_FRAGMENT_CACHE_TIMEOUT=0)
+    def test_timeout_zero_disables_cache(self):
+        """Test a timeout of 0 renders the rows on every request"""
+        question = create_question(question_text='Past question.', days=-30)
+        self.client.get(reverse('polls:index'))
+        Question.objects.filter(pk=question.pk).update(question_text='Renamed without signal.')
+        self.assertContains(self.client.get(reverse('polls:index')), 'Renamed without signal.')
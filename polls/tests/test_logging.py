@@ -0,0 +1,84 @@
+import asyncio
+
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from mysite.log import JsonFormatter, RequestContextFilter, SamplingFilter, current_request
+from mysite.middleware import RequestLogMiddleware
+from polls.models import Choice
+from polls.tests.utils import create_question
+
+
+def make_record(level=logging.INFO, **extra):
+    """Return a log record of the polls logger with extra attributes."""
+    record = logging.LogRecord('polls.views', level, __file__, 1, 'voted for poll#%s', (1,), None)
+    record.__dict__.update(extra)
+    return record
+
+
+class LoggingTests(TestCase):
+    """Tests of the structured request logging."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+
+    def test_json_formatter(self):
+        """Test a record is one JSON line with its extra fields"""
+        line = JsonFormatter().format(make_record(question_id=1, latency_ms=1.5, sample=True))
+        data = json.loads(line)
+        self.assertEqual(data['message'], 'voted for poll#1')
+        self.assertEqual((data['level'], data['question_id'], data['latency_ms']), ('INFO', 1, 1.5))
+        self.assertNotIn('sample', data)
+
+    def test_sampling_filter(self):
+        """Test only sampled info records are dropped"""
+        sampling = SamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(make_record(sample=True)))
+        self.assertTrue(sampling.filter(make_record()))
+        self.assertTrue(sampling.filter(make_record(logging.WARNING, sample=True)))
+        self.assertTrue(SamplingFilter(rate=1).filter(make_record(sample=True)))
+
+    def test_request_context(self):
+        """Test records carry the request id and the loaded user"""
+        request = type('Request', (), {'id': 'abc', '_cached_user': self.user})()
+        token = current_request.set(request)
+        try:
+            record = make_record()
+            RequestContextFilter().filter(record)
+        finally:
+            current_request.reset(token)
+        self.assertEqual((record.request_id, record.user), ('abc', 'Kitty'))
+
+    def test_vote_is_logged_with_request(self):
+        """Test the vote record has the question id and the response the request id"""
+        self.client.force_login(self.user)
+        with self.assertLogs('polls', level='INFO') as logs:
+            response = self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                                        {'choice': self.choice.id}, HTTP_X_REQUEST_ID='req-1')
+        self.assertEqual(response['X-Request-ID'], 'req-1')
+        self.assertEqual(logs.records[0].question_id, self.question.id)
+
+    def test_async_middleware(self):
+        """Test the middleware stays async in an async chain and sets the request context there"""
+        seen = []
+
+        async def get_response(request):
+            seen.append(current_request.get())
+            return HttpResponse()
+
+        middleware = RequestLogMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().get('/', HTTP_X_REQUEST_ID='req-2')
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(response['X-Request-ID'], 'req-2')
+        self.assertEqual(seen, [request])
+        self.assertIsNone(current_request.get())
+        self.assertFalse(asyncio.iscoroutinefunction(RequestLogMiddleware(lambda request: HttpResponse())))
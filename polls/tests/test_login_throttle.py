@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from mysite.throttle import SlidingWindow
+
+
+@override_settings(LOGIN_THROTTLE_USERNAME_LIMIT=3, LOGIN_THROTTLE_IP_LIMIT=5, LOGIN_THROTTLE_WINDOW=300)
+class LoginThrottleTests(TestCase):
+    """Tests of the login throttling."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+
+    def login(self, username='Kitty', password='wrong', ip='10.0.0.1'):
+        """Post the login form and return the response."""
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_username_is_throttled_before_hashing(self):
+        """Test a throttled login does not check the password, even a correct one"""
+        for _ in range(3):
+            self.login()
+        with mock.patch('django.contrib.auth.base_user.check_password') as check_password:
+            response = self.login(password='@yoyo007', ip='10.0.0.2')
+        check_password.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_ip_is_throttled(self):
+        """Test one IP trying many usernames is throttled"""
+        for n in range(5):
+            self.login(username=f'user{n}')
+        with self.assertLogs('mysite.views', level='WARNING') as logs:
+            self.login(password='@yoyo007')
+        self.assertIn('throttled login', logs.output[0])
+        self.assertEqual(logs.records[0].ip_failures, 5)
+
+    def test_success_resets_username(self):
+        """Test a successful login forgets the username's failures"""
+        for _ in range(2):
+            self.login()
+        self.assertEqual(self.login(password='@yoyo007').status_code, 302)
+        self.client.logout()
+        for _ in range(2):
+            self.login()
+        self.assertEqual(self.login(password='@yoyo007').status_code, 302)
+
+    def test_sliding_window(self):
+        """Test the previous window counts in proportion to its overlap"""
+        window = SlidingWindow(cache, 'test', 100)
+        for _ in range(4):
+            window.hit('a', now=150)
+        self.assertEqual(window.count('a', now=150), 4)
+        self.assertEqual(window.count('a', now=225), 3)
+        self.assertEqual(window.count('a', now=275), 1)
+        self.assertEqual(window.count('a', now=300), 0)
@@ -0,0 +1,64 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from mysite.metrics import REQUEST_SECONDS, Histogram, MetricsMiddleware, RequestTiming, current_timing
+from polls.models import Choice
+from polls.tests.utils import create_question
+
+
+class MetricsTests(TestCase):
+    """Tests of the request instrumentation."""
+
+    def setUp(self):
+        self.question = create_question(question_text='Past Question.', days=-5)
+        Choice.objects.create(question=self.question, choice_text='choice_a')
+
+    def test_server_timing(self):
+        """Test each response reports its SQL and template time"""
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+        self.assertNotIn('tpl;dur=0.0,', response['Server-Timing'])
+
+    def test_histogram(self):
+        """Test the buckets are cumulative and count every value"""
+        histogram = Histogram('test_seconds', 'Test.', (0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe('polls:index', value)
+        lines = histogram.collect()
+        self.assertIn('test_seconds_bucket{view="polls:index",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{view="polls:index",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="polls:index",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{view="polls:index"} 3', lines)
+
+    def test_metrics_for_staff_only(self):
+        """Test /metrics is forbidden to other users and lists the views"""
+        self.client.get(reverse('polls:index'))
+        user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'http_request_duration_seconds_count{view="polls:index"}')
+        self.assertIn('polls:index', REQUEST_SECONDS.series)
+
+    def test_async_middleware(self):
+        """Test the middleware stays async in an async chain and times the request there"""
+        seen = []
+
+        async def get_response(request):
+            seen.append(current_timing.get())
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIsInstance(seen[0], RequestTiming)
+        self.assertIsNone(current_timing.get())
@@ -99,3 +99,23 @@ class PollDatesTests(TestCase):
         self.assertIs(question5.can_vote(), False)
         question6 = Question(pub_date=day_before, end_date=time)
         self.assertIs(question6.can_vote(), False)
+
+    def test_with_status_annotation(self):
+        """Test for with_status().
+
+        with_status() must annotate questions as scheduled, open or closed in the database.
+        """
+        time = timezone.now()
+        day = datetime.timedelta(days=1)
+        scheduled = Question.objects.create(pub_date=time+day, end_date=time+2*day)
+        opened = Question.objects.create(pub_date=time-day, end_date=time+day)
+        closed = Question.objects.create(pub_date=time-2*day, end_date=time-day)
+        statuses = dict(Question.objects.with_status(time).values_list('id', 'status'))
+        self.assertEqual(statuses, {
+            scheduled.id: Question.SCHEDULED,
+            opened.id: Question.OPEN,
+            closed.id: Question.CLOSED,
+        })
+        self.assertEqual(list(Question.objects.scheduled(time)), [scheduled])
+        self.assertEqual(list(Question.objects.open(time)), [opened])
+        self.assertEqual(list(Question.objects.closed(time)), [closed])
@@ -0,0 +1,170 @@
+import itertools
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+
+from polls.models import Choice, Vote
+from polls.tests.utils import create_question
+
+# Maximum number of queries for one request to each polls URL, including the
+# session and user lookups of an authenticated request. The count must also
+# stay the same when the dataset grows, so N+1 patterns fail even under budget.
+# Every URL of polls.urls needs a budget; "(304)" is a conditional request
+# with the current ETag.
+QUERY_BUDGETS = {
+    'polls:index': 4,
+    'polls:detail': 5,
+    'polls:results': 4,
+    'polls:results_stream': 1,
+    'polls:vote': 13,
+    'polls:vote (no choice)': 5,
+    'polls:results_json': 3,
+    'polls:results_json (304)': 1,
+    'polls:bulk_results_json': 3,
+    'polls:bulk_results_json (304)': 1,
+    'polls:timeline_json': 2,
+    'polls:timeline_json (304)': 1,
+}
+
+
+class QueryBudgetMixin:
+    """Assertions to keep the number of queries of a request within budget."""
+
+    def assertWithinBudget(self, name, request):
+        """Run request and fail with the offending SQL if it exceeds the budget of name.
+
+        Returns:
+            int : the number of queries the request executed
+        """
+        budget = QUERY_BUDGETS[name]
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        if len(context) > budget:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, 1))
+            self.fail(f"{name} executed {len(context)} queries, budget is {budget}:\n{queries}")
+        return len(context)
+
+    def assertBudgetHoldsAsDataGrows(self, name, request):
+        """Check request stays within budget and runs the same number of queries on a larger dataset."""
+        small = self.assertWithinBudget(name, request)
+        self.grow_dataset()
+        large = self.assertWithinBudget(name, request)
+        self.assertEqual(small, large, f"{name} queries grew from {small} to {large} with the dataset")
+
+    def assertNotModifiedBudgetHoldsAsDataGrows(self, name, url):
+        """Check a conditional request of url with its current ETag is a 304 within the budget of name."""
+        def not_modified():
+            etag = self.client.get(url)['ETag']
+
+            def request():
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                return response
+            return request
+
+        small = self.assertWithinBudget(name, not_modified())
+        self.grow_dataset()
+        large = self.assertWithinBudget(name, not_modified())
+        self.assertEqual(small, large, f"{name} queries grew from {small} to {large} with the dataset")
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Tests of the query budget of every polls URL."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.client.login(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.other_choice = Choice.objects.create(question=self.question, choice_text='choice_b')
+        self.question.update_question_vote(self.user, self.choice)
+
+    def grow_dataset(self):
+        """Add questions, choices and other users' votes."""
+        voters = [get_user_model().objects.create(username=f"voter{i}") for i in range(10)]
+        for i in range(10):
+            question = create_question(question_text=f'Question {i}.', days=-i)
+            choices = [Choice.objects.create(question=question, choice_text=f'choice {j}') for j in range(5)]
+            Choice.objects.create(question=self.question, choice_text=f'extra choice {i}')
+            for voter in voters:
+                Vote.objects.create(question=question, choice=choices[0], user=voter)
+                self.user.vote_set.get_or_create(question=question, defaults={'choice': choices[1]})
+        for voter in voters:
+            Vote.objects.create(question=self.question, choice=self.choice, user=voter)
+
+    def test_index_budget(self):
+        """Test the index page query budget"""
+        self.assertBudgetHoldsAsDataGrows(
+            'polls:index', lambda: self.client.get(reverse('polls:index')))
+
+    def test_detail_budget(self):
+        """Test the detail page query budget"""
+        self.assertBudgetHoldsAsDataGrows(
+            'polls:detail', lambda: self.client.get(reverse('polls:detail', args=(self.question.id,))))
+
+    def test_results_budget(self):
+        """Test the results page query budget"""
+        self.assertBudgetHoldsAsDataGrows(
+            'polls:results', lambda: self.client.get(reverse('polls:results', args=(self.question.id,))))
+
+    def test_vote_budget(self):
+        """Test the vote query budget"""
+        choices = itertools.cycle([self.other_choice, self.choice])
+        self.assertBudgetHoldsAsDataGrows(
+            'polls:vote',
+            lambda: self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': next(choices).id}))
+
+    def test_vote_without_choice_budget(self):
+        """Test the vote query budget when no choice is selected"""
+        self.assertBudgetHoldsAsDataGrows(
+            'polls:vote (no choice)', lambda: self.client.post(reverse('polls:vote', args=(self.question.id,))))
+
+    def test_results_stream_budget(self):
+        """Test the live results stream query budget, before streaming"""
+        def request():
+            response = self.client.get(reverse('polls:results_stream', args=(self.question.id,)))
+            response.close()
+            return response
+        self.assertBudgetHoldsAsDataGrows('polls:results_stream', request)
+
+    def test_results_json_budget(self):
+        """Test the results API query budget"""
+        url = reverse('polls:results_json', args=(self.question.id,))
+        self.assertBudgetHoldsAsDataGrows('polls:results_json', lambda: self.client.get(url))
+
+    def test_results_json_not_modified_budget(self):
+        """Test the results API query budget of a request with the current ETag"""
+        url = reverse('polls:results_json', args=(self.question.id,))
+        self.assertNotModifiedBudgetHoldsAsDataGrows('polls:results_json (304)', url)
+
+    def test_bulk_results_json_budget(self):
+        """Test the bulk results API query budget"""
+        url = reverse('polls:bulk_results_json') + f'?ids={self.question.id},{self.question.id + 1}'
+        self.assertBudgetHoldsAsDataGrows('polls:bulk_results_json', lambda: self.client.get(url))
+
+    def test_bulk_results_json_not_modified_budget(self):
+        """Test the bulk results API query budget of a request with the current ETag"""
+        url = reverse('polls:bulk_results_json') + f'?ids={self.question.id},{self.question.id + 1}'
+        self.assertNotModifiedBudgetHoldsAsDataGrows('polls:bulk_results_json (304)', url)
+
+    def test_timeline_json_budget(self):
+        """Test the timeline API query budget"""
+        url = reverse('polls:timeline_json', args=(self.question.id,))
+        self.assertBudgetHoldsAsDataGrows('polls:timeline_json', lambda: self.client.get(url))
+
+    def test_timeline_json_not_modified_budget(self):
+        """Test the timeline API query budget of a request with the current ETag"""
+        url = reverse('polls:timeline_json', args=(self.question.id,))
+        self.assertNotModifiedBudgetHoldsAsDataGrows('polls:timeline_json (304)', url)
+
+    def test_every_url_has_a_budget(self):
+        """Test every named polls URL has a query budget"""
+        names = {name for name in get_resolver('polls.urls').reverse_dict if isinstance(name, str)}
+        budgeted = {name.split(' ')[0] for name in QUERY_BUDGETS}
+        self.assertEqual({f'polls:{name}' for name in names} - budgeted, set())
@@ -0,0 +1,48 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from polls.models import Choice, Question
+from polls.reconcile import reconcile
+from polls.tests.utils import create_question
+
+
+class ReconcileTests(TestCase):
+    """Tests of the reconcilevotes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.choice_b = Choice.objects.create(question=self.question, choice_text='choice_b')
+        self.question.update_question_vote(self.user, self.choice_a)
+        Choice.objects.filter(pk=self.choice_a.pk).update(votes=5)
+        Choice.objects.filter(pk=self.choice_b.pk).update(votes=2)
+
+    def test_dry_run_reports_drift(self):
+        """Test a dry run reports the wrong tallies without fixing them"""
+        mismatches = reconcile(dry_run=True)
+        self.assertEqual(mismatches, [
+            (self.choice_a.id, self.question.id, 5, 1),
+            (self.choice_b.id, self.question.id, 2, 0),
+        ])
+        self.assertEqual(Choice.objects.get(pk=self.choice_a.pk).votes, 5)
+
+    def test_fix_drift(self):
+        """Test the tallies are recounted and the results version changes"""
+        version = Question.objects.get(pk=self.question.pk).version
+        stdout = io.StringIO()
+        call_command('reconcilevotes', chunk_size=1, stdout=stdout)
+        self.assertIn('Fixed 2 tally(ies).', stdout.getvalue())
+        self.assertEqual(dict(Choice.objects.values_list('id', 'votes')), {self.choice_a.id: 1, self.choice_b.id: 0})
+        self.assertEqual(Question.objects.get(pk=self.question.pk).version, version + 2)
+        self.assertEqual(reconcile(), [])
+
+    def test_question_scope(self):
+        """Test only the choices of the given questions are checked"""
+        other = create_question(question_text='Other Question.', days=-1)
+        Choice.objects.create(question=other, choice_text='choice_c', votes=3)
+        self.assertEqual(len(reconcile([other.id])), 1)
+        self.assertEqual(Choice.objects.get(pk=self.choice_a.pk).votes, 5)
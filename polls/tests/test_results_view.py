@@ -0,0 +1,214 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.cache import results_cache_stats
+from polls import live
+from polls.live import STREAM_RETRY_AFTER, QuestionPoller, results_event
+from polls.models import Choice, Question
+from polls.tests.utils import create_question
+
+
+class ResultsViewTests(TestCase):
+    """Tests of the cached results view."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_results_table_is_cached(self):
+        """Test the second hit is served from the cache without reading choices"""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'choice_a')
+        self.assertEqual(results_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_vote_invalidates_results(self):
+        """Test a vote changes the version so the new count is shown"""
+        self.client.get(self.url)
+        self.question.update_question_vote(self.user, self.choice)
+        response = self.client.get(self.url)
+        self.assertContains(response, f'<th id="choice-{self.choice.id}-votes">1</th>', html=True)
+        self.assertEqual(results_cache_stats(), {'hits': 0, 'misses': 2})
+
+    def test_choice_change_invalidates_results(self):
+        """Test editing a choice changes the version so the new text is shown"""
+        self.client.get(self.url)
+        self.choice.choice_text = 'renamed'
+        self.choice.save()
+        self.assertContains(self.client.get(self.url), 'renamed')
+
+    def test_question_change_invalidates_results(self):
+        """Test editing the question text changes the version, other edits keep it"""
+        version = Question.objects.get(pk=self.question.pk).version
+        self.question.end_date += datetime.timedelta(days=1)
+        self.question.save()
+        self.assertEqual(Question.objects.get(pk=self.question.pk).version, version)
+        self.client.get(self.url)
+        self.question.question_text = 'Renamed Question.'
+        self.question.save()
+        self.assertEqual(Question.objects.get(pk=self.question.pk).version, version + 1)
+        self.assertContains(self.client.get(self.url), 'Renamed Question.')
+
+    def test_stale_question_keeps_version(self):
+        """Test saving a stale question does not move its version back"""
+        stale = Question.objects.get(pk=self.question.pk)
+        self.question.update_question_vote(self.user, self.choice)
+        version = Question.objects.get(pk=self.question.pk).version
+        stale.end_date += datetime.timedelta(days=1)
+        stale.save()
+        self.assertEqual(Question.objects.get(pk=self.question.pk).version, version)
+
+
+class LiveResultsTests(TestCase):
+    """Tests of the live results stream."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+
+    def test_poller_reloads_counts_when_version_changes(self):
+        """Test the poller only reads the choices after a vote"""
+        poller = QuestionPoller(self.question.id, interval=1)
+        poller.poll()
+        self.assertEqual(poller.counts, {self.choice.id: 0})
+        with self.assertNumQueries(1):
+            poller.poll()
+        self.question.update_question_vote(self.user, self.choice)
+        poller.poll()
+        self.assertEqual(poller.wait(None, timeout=0), (poller.version, {self.choice.id: 1}))
+
+    def test_poller_survives_failed_poll(self):
+        """Test a failed poll is logged and retried, and the poller unregisters when done"""
+        poller = QuestionPoller(self.question.id, interval=0)
+        poller.subscribers = 1
+        live._pollers[self.question.id] = poller
+        self.addCleanup(live._pollers.pop, self.question.id, None)
+        calls = []
+
+        def poll():
+            calls.append(None)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            poller.subscribers = 0
+
+        poller.poll = poll
+        with self.assertLogs('polls.live', 'ERROR'):
+            poller.run()
+        self.assertEqual(len(calls), 2)
+        self.assertNotIn(self.question.id, live._pollers)
+
+    def test_poller_unregisters_on_crash(self):
+        """Test a poller that stops on an unexpected error leaves no dead entry behind"""
+        poller = QuestionPoller(self.question.id, interval=0)
+        poller.subscribers = 1
+        live._pollers[self.question.id] = poller
+        self.addCleanup(live._pollers.pop, self.question.id, None)
+        poller.poll = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            poller.run()
+        self.assertNotIn(self.question.id, live._pollers)
+
+    def test_results_event_sends_changed_counts(self):
+        """Test an event only contains the changed choices"""
+        event = results_event(3, {1: 2, 2: 5, 3: 1}, {1: 2, 2: 6})
+        self.assertEqual(event, 'id: 3\nevent: results\ndata: {"version": 3, "choices": {"2": 6}, "removed": [3]}\n\n')
+
+    def test_stream_view(self):
+        """Test the stream is served as Server-Sent Events"""
+        response = self.client.get(reverse('polls:results_stream', args=(self.question.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+        response.close()
+
+    @override_settings(POLLS_STREAM_MAX_CLIENTS=1)
+    def test_stream_limit(self):
+        """Test a client over POLLS_STREAM_MAX_CLIENTS is asked to retry, until a stream closes"""
+        url = reverse('polls:results_stream', args=(self.question.id,))
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        rejected = self.client.get(url)
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected['Retry-After'], str(STREAM_RETRY_AFTER))
+        response.close()
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        response.close()
+
+    def test_live_option(self):
+        """Test the results page subscribes to the stream with ?live"""
+        url = reverse('polls:results', args=(self.question.id,))
+        self.assertNotContains(self.client.get(url), 'EventSource')
+        self.assertContains(self.client.get(url + '?live'), 'EventSource')
+
+
+class ResultsApiTests(TestCase):
+    """Tests of the JSON results API."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.url = reverse('polls:results_json', args=(self.question.id,))
+
+    def test_question_results(self):
+        """Test the JSON contains the choice ids, texts and counts"""
+        self.question.update_question_vote(self.user, self.choice)
+        response = self.client.get(self.url)
+        self.question.refresh_from_db()
+        self.assertEqual(response.json(), {
+            'id': self.question.id,
+            'question_text': 'Past Question.',
+            'version': self.question.version,
+            'choices': [{'id': self.choice.id, 'choice_text': 'choice_a', 'votes': 1}],
+        })
+        self.assertEqual(response['ETag'], f'"{self.question.id}-{self.question.version}"')
+        self.assertIn('Last-Modified', response)
+
+    def test_not_modified_without_reading_choices(self):
+        """Test a matching If-None-Match gets a 304 after one query"""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_vote_changes_etag(self):
+        """Test a vote makes the old ETag stale"""
+        etag = self.client.get(self.url)['ETag']
+        self.question.update_question_vote(self.user, self.choice)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_question(self):
+        """Test an unknown question is a 404"""
+        response = self.client.get(reverse('polls:results_json', args=(self.question.id + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_results(self):
+        """Test the bulk view reads every question's choices in one query"""
+        other = create_question(question_text='Other Question.', days=-1)
+        Choice.objects.create(question=other, choice_text='choice_b')
+        url = reverse('polls:bulk_results_json') + f'?ids={other.id},{self.question.id},999'
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual([question['id'] for question in response.json()['questions']], [self.question.id, other.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.question.update_question_vote(self.user, self.choice)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_bulk_results_invalid_ids(self):
+        """Test invalid ids are a 400"""
+        response = self.client.get(reverse('polls:bulk_results_json') + '?ids=1,x')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,81 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Vote, VoteRollup, truncate_hour
+from polls.rollups import get_timeline, rebuild_rollups
+from polls.tests.utils import create_question
+
+
+class VoteRollupTests(TestCase):
+    """Tests of the vote timestamps and hourly rollups."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.another_user = get_user_model().objects.create_user(username="Dicky", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.choice_b = Choice.objects.create(question=self.question, choice_text='choice_b')
+
+    def rollup_totals(self):
+        """Return choice id -> sum of its rollups."""
+        totals = {}
+        for choice_id, votes in VoteRollup.objects.values_list('choice_id', 'votes'):
+            totals[choice_id] = totals.get(choice_id, 0) + votes
+        return totals
+
+    def test_vote_is_timestamped(self):
+        """Test a vote records when it was created"""
+        before = timezone.now()
+        self.question.update_question_vote(self.user, self.choice_a)
+        self.assertGreaterEqual(Vote.objects.get(user=self.user).created, before)
+
+    def test_votes_update_current_hour(self):
+        """Test votes and switches add up in the rollup of the current hour"""
+        self.question.update_question_vote(self.user, self.choice_a)
+        self.question.update_question_vote(self.another_user, self.choice_a)
+        self.question.update_question_vote(self.user, self.choice_b)
+        self.assertEqual(VoteRollup.objects.count(), 2)
+        self.assertEqual(VoteRollup.objects.get(choice=self.choice_a).hour, truncate_hour(timezone.now()))
+        self.assertEqual(self.rollup_totals(), {self.choice_a.id: 1, self.choice_b.id: 1})
+
+    def test_timeline(self):
+        """Test the timeline adds the hourly changes up to the totals"""
+        last_hour = timezone.now() - datetime.timedelta(hours=1)
+        VoteRollup.objects.add({(self.question.id, self.choice_a.id): 2}, moment=last_hour)
+        self.question.update_question_vote(self.user, self.choice_b)
+        timeline = get_timeline(self.question.id)
+        self.assertEqual([bucket['votes'] for bucket in timeline], [{self.choice_a.id: 2}, {self.choice_b.id: 1}])
+        self.assertEqual(timeline[-1]['totals'], {self.choice_a.id: 2, self.choice_b.id: 1})
+        since = get_timeline(self.question.id, since=truncate_hour(timezone.now()))
+        self.assertEqual(since, timeline[1:])
+
+    def test_timeline_view_reads_rollups(self):
+        """Test the timeline view does not read the votes"""
+        self.question.update_question_vote(self.user, self.choice_a)
+        url = reverse('polls:timeline_json', args=(self.question.id,))
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['timeline'][0]['totals'], {str(self.choice_a.id): 1})
+        self.assertEqual(self.client.get(url + '?since=yesterday').status_code, 400)
+
+    def test_timeline_etag_depends_on_since(self):
+        """Test each ?since= window has its own ETag"""
+        self.question.update_question_vote(self.user, self.choice_a)
+        url = reverse('polls:timeline_json', args=(self.question.id,))
+        window = url + '?since=2020-01-01T00:00:00Z'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(window, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(window)['ETag'], etag)
+
+    def test_rebuild(self):
+        """Test rebuilt rollups add up to the votes"""
+        self.question.update_question_vote(self.user, self.choice_a)
+        self.question.update_question_vote(self.another_user, self.choice_b)
+        VoteRollup.objects.all().delete()
+        self.assertEqual(rebuild_rollups(), 2)
+        self.assertEqual(self.rollup_totals(), {self.choice_a.id: 1, self.choice_b.id: 1})
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from mysite.routers import PIN_COOKIE, PrimaryPin, PrimaryPinMiddleware, PrimaryReplicaRouter, current_pin
+from polls.models import Choice, Question
+from polls.tests.utils import create_question
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], DATABASE_PIN_SECONDS=10)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    """Tests of the primary/replica router and the pin middleware."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request):
+        """Run request through the middleware and return the database of a read and the response."""
+        reads = []
+
+        def get_response(request):
+            reads.append(self.router.db_for_read(Question))
+            return HttpResponse()
+
+        response = PrimaryPinMiddleware(get_response)(request)
+        return reads[0], response
+
+    def test_reads_go_to_replicas(self):
+        """Reads of a request go to a replica and writes to the primary."""
+        token = current_pin.set(PrimaryPin(pinned=False))
+        try:
+            self.assertIn(self.router.db_for_read(Question), ['replica1', 'replica2'])
+            self.assertEqual(self.router.db_for_write(Question), 'default')
+        finally:
+            current_pin.reset(token)
+
+    def test_reads_outside_requests(self):
+        """Reads outside a request, e.g. from management commands, go to the primary."""
+        self.assertEqual(self.router.db_for_read(Question), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Without replicas the router leaves reads to the default database."""
+        token = current_pin.set(PrimaryPin(pinned=False))
+        try:
+            self.assertIsNone(self.router.db_for_read(Question))
+        finally:
+            current_pin.reset(token)
+
+    def test_instance_hint(self):
+        """Related objects are read from the database of their instance."""
+        question = Question()
+        question._state.db = 'default'
+        self.assertEqual(self.router.db_for_read(Choice, instance=question), 'default')
+
+    def test_pinned_reads(self):
+        """A pinned request reads from the primary and records its writes."""
+        pin = PrimaryPin(pinned=True)
+        token = current_pin.set(pin)
+        try:
+            self.assertEqual(self.router.db_for_read(Question), 'default')
+            self.router.db_for_write(Question)
+        finally:
+            current_pin.reset(token)
+        self.assertTrue(pin.wrote)
+
+    def test_allow_migrate(self):
+        """Replicas are not migrated."""
+        self.assertFalse(self.router.allow_migrate('replica1', 'polls'))
+        self.assertIsNone(self.router.allow_migrate('default', 'polls'))
+
+    def test_safe_request_reads_replica(self):
+        """A GET without the cookie reads from a replica and sets no cookie."""
+        database, response = self.route(self.factory.get('/'))
+        self.assertNotEqual(database, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_request_reads_primary(self):
+        """A POST reads from the primary."""
+        database, _ = self.route(self.factory.post('/'))
+        self.assertEqual(database, 'default')
+
+    def test_pin_cookie(self):
+        """A client with a pin cookie reads from the primary until it expires."""
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() + 5)
+        self.assertEqual(self.route(request)[0], 'default')
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        self.assertNotEqual(self.route(request)[0], 'default')
+
+    def test_write_sets_pin_cookie(self):
+        """A request that wrote pins the client to the primary."""
+        def get_response(request):
+            self.router.db_for_write(Question)
+            return HttpResponse()
+
+        response = PrimaryPinMiddleware(get_response)(self.factory.post('/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+        self.assertGreater(float(response.cookies[PIN_COOKIE].value), time.time())
+
+    def test_async_middleware(self):
+        """In an async chain the pin is set for the sync_to_async work of the view."""
+        async def get_response(request):
+            await sync_to_async(self.router.db_for_write)(Question)
+            return HttpResponse()
+
+        middleware = PrimaryPinMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(current_pin.get())
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class PrimaryPinVoteTests(TestCase):
+    """Tests of read-your-writes pinning on the polls pages."""
+
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.client.login(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = Choice.objects.create(question=self.question, choice_text='choice_a')
+
+    def test_vote_pins_client(self):
+        """Voting sets the pin cookie, so the results page reads the new vote from the primary."""
+        response = self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, f'<th id="choice-{self.choice.id}-votes">1</th>', html=True)
+
+    def test_syncreplicas_needs_replicas(self):
+        """syncreplicas refuses to run without replicas."""
+        with override_settings(DATABASE_REPLICAS=[]):
+            with self.assertRaises(CommandError):
+                call_command('syncreplicas')
@@ -0,0 +1,96 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from polls.management.commands.seedpolls import allocate, zipf_weights
+from polls.models import Choice, Question, Vote, VoteRollup
+from polls.reconcile import reconcile
+
+
+def seed(**options):
+    """Run seedpolls with a small dataset and return its output."""
+    out = io.StringIO()
+    call_command('seedpolls', users=50, questions=10, choices=3, votes=200, seed=7,
+                 stdout=out, stderr=io.StringIO(), **options)
+    return out.getvalue()
+
+
+class AllocateTests(TestCase):
+    """Tests of the vote allocation helpers."""
+
+    def test_allocate_sums_to_total(self):
+        """allocate() splits the total exactly when no entry is capped."""
+        counts = allocate(1000, zipf_weights(10, 1.1), 1000)
+        self.assertEqual(sum(counts), 1000)
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_allocate_respects_cap(self):
+        """Shares above the cap go to the other entries."""
+        counts = allocate(100, zipf_weights(4, 2), 30)
+        self.assertEqual(sum(counts), 100)
+        self.assertEqual(max(counts), 30)
+
+    def test_allocate_everything_capped(self):
+        """The total is cut to the sum of the caps."""
+        self.assertEqual(allocate(100, [1, 1], 10), [10, 10])
+
+
+class SeedPollsTests(TestCase):
+    """Tests of the seedpolls command."""
+
+    def test_creates_dataset(self):
+        """Users, questions, choices and votes are created with consistent tallies and rollups."""
+        output = seed()
+        self.assertIn('200 votes', output)
+        self.assertEqual(get_user_model().objects.filter(username__startswith='seed').count(), 50)
+        self.assertEqual(Question.objects.count(), 10)
+        self.assertEqual(Choice.objects.count(), 30)
+        self.assertEqual(Vote.objects.count(), 200)
+        self.assertEqual(Choice.objects.aggregate(total=Sum('votes'))['total'], 200)
+        self.assertEqual(VoteRollup.objects.aggregate(total=Sum('votes'))['total'], 200)
+        self.assertEqual(reconcile(), [])
+
+    def test_status_mix(self):
+        """Questions follow the status mix, and votes go to published questions only."""
+        seed(status_mix='0,0,1')
+        self.assertEqual(Question.objects.scheduled().count(), 10)
+        self.assertEqual(Vote.objects.count(), 0)
+        Question.objects.all().delete()
+        seed(status_mix='0,1,0', username_prefix='closed')
+        self.assertEqual(Question.objects.closed().count(), 10)
+        for vote in Vote.objects.select_related('question'):
+            self.assertTrue(vote.question.pub_date <= vote.created <= vote.question.end_date)
+
+    def test_same_seed_same_dataset(self):
+        """The same seed gives the same votes."""
+        seed()
+        first = list(Vote.objects.order_by('id').values_list(
+            'question__question_text', 'choice__choice_text', 'user__username'))
+        Vote.objects.all().delete()
+        Question.objects.all().delete()
+        get_user_model().objects.all().delete()
+        seed()
+        second = list(Vote.objects.order_by('id').values_list(
+            'question__question_text', 'choice__choice_text', 'user__username'))
+        self.assertEqual(first, second)
+
+    def test_votes_are_skewed(self):
+        """The most popular question gets more votes than the least popular one."""
+        seed()
+        totals = sorted(total or 0 for total in
+                        Question.objects.annotate(total=Sum('choice__votes')).values_list('total', flat=True))
+        self.assertGreater(totals[-1], totals[0] * 2)
+
+    def test_existing_prefix(self):
+        """Seeding twice with the same username prefix is refused."""
+        seed()
+        with self.assertRaises(CommandError):
+            seed()
+
+    def test_bad_status_mix(self):
+        """The status mix needs three shares."""
+        with self.assertRaises(CommandError):
+            seed(status_mix='1,2')
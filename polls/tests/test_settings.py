@@ -0,0 +1,73 @@
+import os
+import runpy
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import SimpleTestCase, override_settings
+
+
+def load_settings(**environ):
+    """Return the names defined by mysite/settings.py under the given environment variables."""
+    with mock.patch.dict(os.environ, {'SECRET_KEY': 'secret', **environ}):
+        for name in ('DATABASE_PROFILE', 'TEMPLATE_CACHE'):
+            if name not in environ:
+                os.environ.pop(name, None)
+        return runpy.run_path(str(settings.BASE_DIR / 'mysite' / 'settings.py'))
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    """Tests of the SQLite production profile."""
+
+    def test_production_profile(self):
+        """The profile keeps connections open and tunes every new SQLite connection."""
+        profile = load_settings(DATABASE_PROFILE='production')
+        self.assertEqual(profile['DATABASES']['default']['CONN_MAX_AGE'], 600)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connection = connections['default'].__class__(
+            {**connections.databases['default'], 'NAME': os.path.join(directory.name, 'profile.sqlite3')},
+            alias='profile',
+        )
+        self.addCleanup(connection.close)
+        with override_settings(SQLITE_PRAGMAS=profile['SQLITE_PRAGMAS']):
+            connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_development_profile(self):
+        """Without the profile, connections are closed after each request and keep SQLite's defaults."""
+        development = load_settings()
+        self.assertNotIn('CONN_MAX_AGE', development['DATABASES']['default'])
+        self.assertEqual(development['SQLITE_PRAGMAS'], {})
+
+
+class TemplateCacheTests(SimpleTestCase):
+    """Tests of the TEMPLATE_CACHE setting."""
+
+    def template_loaders(self, **environ):
+        """Return the loaders of the template engine configured by settings.py under environ, with DEBUG on."""
+        configured = load_settings(**environ)
+        with override_settings(TEMPLATES=configured['TEMPLATES'], DEBUG=True):
+            return engines.all()[0].engine.template_loaders
+
+    def test_cached_loader_when_enabled(self):
+        """TEMPLATE_CACHE, or the production profile, keeps compiled templates even in DEBUG."""
+        for environ in ({'TEMPLATE_CACHE': 'True'}, {'DATABASE_PROFILE': 'production'}):
+            with self.subTest(**environ):
+                loaders = self.template_loaders(**environ)
+                self.assertEqual([type(loader) for loader in loaders], [CachedLoader])
+
+    def test_no_cached_loader_in_debug(self):
+        """Without TEMPLATE_CACHE, templates are read again on every render in DEBUG."""
+        loaders = self.template_loaders()
+        self.assertNotIn(CachedLoader, [type(loader) for loader in loaders])
+        self.assertTrue(loaders)
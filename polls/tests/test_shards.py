@@ -0,0 +1,244 @@
+import io
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from polls.ballots import UserBallot
+from polls.models import Choice, QuestionStamp, ShardRollup, ShardTally, ShardVote, Vote
+from polls.reconcile import fix_shard_tallies, reconcile
+from polls.shards import VoteShardRouter, get_stamps, get_user_choices, shard_for
+from polls.tests.utils import create_question
+from polls.writebehind import VoteBuffer
+
+SHARDS = ['test_votes0', 'test_votes1']
+
+
+@override_settings(POLLS_VOTE_SHARDS=SHARDS)
+class VoteShardRouterTests(SimpleTestCase):
+    """Tests of the vote shard router."""
+
+    def test_shard_for(self):
+        """Questions are spread over the shards by id."""
+        self.assertEqual([shard_for(question_id) for question_id in range(4)], SHARDS * 2)
+
+    def test_allow_migrate(self):
+        """The shards only hold the shard models, and the shard models only live in the shards."""
+        router = VoteShardRouter()
+        self.assertTrue(router.allow_migrate('test_votes0', 'polls', 'shardvote'))
+        self.assertFalse(router.allow_migrate('test_votes0', 'polls', 'question'))
+        self.assertFalse(router.allow_migrate('test_votes0', 'auth', 'user'))
+        self.assertFalse(router.allow_migrate('default', 'polls', 'shardtally'))
+        self.assertIsNone(router.allow_migrate('default', 'polls', 'vote'))
+
+    def test_instance_routing(self):
+        """A shard model instance is saved to the shard of its question."""
+        router = VoteShardRouter()
+        self.assertEqual(router.db_for_write(ShardVote, instance=ShardVote(question_id=3)), 'test_votes1')
+        self.assertIsNone(router.db_for_write(Vote, instance=Vote(question_id=3)))
+
+
+@override_settings(POLLS_VOTE_SHARDS=SHARDS)
+class ShardedVoteTests(TestCase):
+    """Tests of the polls pages with the votes stored in two shards."""
+
+    @classmethod
+    def setUpClass(cls):
+        # The shards are added after TestCase has set up its databases, so
+        # the test runner does not migrate them as copies of default. Their
+        # rows are deleted by tearDown instead of a rolled back transaction.
+        super().setUpClass()
+        cls.shard_dir = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                **connections.databases['default'],
+                'NAME': str(Path(cls.shard_dir) / f'{alias}.sqlite3'),
+                'TEST': {},
+            }
+            call_command('migrate', database=alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.shard_dir)
+        super().tearDownClass()
+
+    def tearDown(self):
+        for alias in SHARDS:
+            for model in (ShardVote, ShardTally, ShardRollup, QuestionStamp):
+                model.objects.using(alias).all().delete()
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.client.login(username="Kitty", password="@yoyo007")
+        self.questions = [create_question(question_text=f'Question {index}.', days=-5) for index in range(2)]
+        self.choices = [
+            [Choice.objects.create(question=question, choice_text=f'choice_{letter}') for letter in 'ab']
+            for question in self.questions
+        ]
+
+    def vote(self, question, choice):
+        return self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+
+    def test_votes_go_to_their_shard(self):
+        """Votes on two questions are written to the two shards, not the default database."""
+        for question, choices in zip(self.questions, self.choices):
+            self.vote(question, choices[0])
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual({shard_for(question.id) for question in self.questions}, set(SHARDS))
+        for question, choices in zip(self.questions, self.choices):
+            alias = shard_for(question.id)
+            self.assertEqual(ShardVote.objects.using(alias).get().choice_id, choices[0].id)
+            self.assertEqual(ShardTally.objects.using(alias).get(pk=choices[0].id).votes, 1)
+
+    def test_switch_vote(self):
+        """Changing the vote moves the count between choices and bumps the stamp."""
+        question, (choice_a, choice_b) = self.questions[0], self.choices[0]
+        self.vote(question, choice_a)
+        version = get_stamps([question.id])[question.id][0]
+        self.vote(question, choice_b)
+        alias = shard_for(question.id)
+        self.assertEqual(dict(ShardTally.objects.using(alias).values_list('choice_id', 'votes')),
+                         {choice_a.id: 0, choice_b.id: 1})
+        self.assertGreater(get_stamps([question.id])[question.id][0], version)
+
+    def test_same_choice_keeps_stamp(self):
+        """Voting the same choice again does not change the stamp."""
+        question, choice = self.questions[0], self.choices[0][0]
+        self.vote(question, choice)
+        stamp = get_stamps([question.id])[question.id]
+        self.vote(question, choice)
+        self.assertEqual(get_stamps([question.id])[question.id], stamp)
+
+    def test_upsert_honours_using(self):
+        """An explicit .using() wins over the shard the router picks for the question."""
+        question, choice = self.questions[0], self.choices[0][0]
+        other = next(alias for alias in SHARDS if alias != shard_for(question.id))
+        ShardVote.objects.using(other).upsert(question=question, choice=choice, user=self.user)
+        self.assertTrue(ShardVote.objects.using(other).filter(question_id=question.id).exists())
+        self.assertFalse(ShardVote.objects.using(shard_for(question.id)).exists())
+
+    def test_rollup_add_honours_using(self):
+        """An explicit .using() wins over the shard the router picks for the rollup's question."""
+        question, choice = self.questions[0], self.choices[0][0]
+        other = next(alias for alias in SHARDS if alias != shard_for(question.id))
+        ShardRollup.objects.using(other).add({(question.id, choice.id): 1})
+        self.assertEqual(ShardRollup.objects.using(other).get().votes, 1)
+        self.assertFalse(ShardRollup.objects.using(shard_for(question.id)).exists())
+
+    def test_ballot_fans_out(self):
+        """The user's ballot reads the votes of every shard."""
+        for question, choices in zip(self.questions, self.choices):
+            self.vote(question, choices[1])
+        expected = {question.id: choices[1].id for question, choices in zip(self.questions, self.choices)}
+        self.assertEqual(get_user_choices(self.user.id), expected)
+        ballot = UserBallot(self.user)
+        ballot.load([question.id for question in self.questions])
+        self.assertEqual(ballot.get(self.questions[1].id), self.choices[1][1].id)
+
+    def test_results_read_shard_counts(self):
+        """The results page and the results API show the counts of the shard."""
+        question, choice = self.questions[1], self.choices[1][0]
+        self.vote(question, choice)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertContains(response, f'<th id="choice-{choice.id}-votes">1</th>', html=True)
+        data = self.client.get(reverse('polls:results_json', args=(question.id,))).json()
+        self.assertEqual({item['id']: item['votes'] for item in data['choices']},
+                         {choice.id: 1, self.choices[1][1].id: 0})
+        ids = ','.join(str(question.id) for question in self.questions)
+        data = self.client.get(reverse('polls:bulk_results_json') + f'?ids={ids}').json()
+        self.assertEqual(data['questions'][1]['choices'][0]['votes'], 1)
+
+    def test_reconcile_shards(self):
+        """Drift in a shard tally is found and recounted in that shard."""
+        question, choice = self.questions[0], self.choices[0][0]
+        self.vote(question, choice)
+        alias = shard_for(question.id)
+        ShardTally.objects.using(alias).filter(pk=choice.id).update(votes=4)
+        self.assertEqual(reconcile(dry_run=True), [(choice.id, question.id, 4, 1)])
+        reconcile()
+        self.assertEqual(ShardTally.objects.using(alias).get(pk=choice.id).votes, 1)
+        self.assertEqual(reconcile(), [])
+
+    def test_reconcile_shards_in_bulk(self):
+        """Drifted and missing shard tallies are fixed without a query per choice."""
+        question, (choice_a, choice_b) = self.questions[0], self.choices[0]
+        self.vote(question, choice_a)
+        alias = shard_for(question.id)
+        ShardTally.objects.using(alias).filter(pk=choice_a.id).update(votes=7)
+        ShardVote.objects.using(alias).create(question_id=question.id, choice_id=choice_b.id, user_id=self.user.id + 1)
+        ShardTally.objects.using(alias).filter(pk=choice_b.id).delete()
+        mismatches = reconcile(dry_run=True)
+        self.assertEqual(len(mismatches), 2)
+        with self.assertNumQueries(6, using=alias):
+            fix_shard_tallies(mismatches)
+        self.assertEqual(dict(ShardTally.objects.using(alias).values_list('choice_id', 'votes')),
+                         {choice_a.id: 1, choice_b.id: 1})
+        self.assertEqual(reconcile(), [])
+
+    def test_timeline_reads_shard_rollups(self):
+        """Votes update the hourly rollups of their shard, which the timeline reads and can rebuild."""
+        question, (choice_a, choice_b) = self.questions[1], self.choices[1]
+        self.vote(question, choice_a)
+        self.vote(question, choice_b)
+        url = reverse('polls:timeline_json', args=(question.id,))
+        timeline = self.client.get(url).json()['timeline']
+        self.assertEqual(timeline[-1]['totals'], {str(choice_a.id): 0, str(choice_b.id): 1})
+        ShardRollup.objects.using(shard_for(question.id)).all().delete()
+        call_command('reconcilevotes', rebuild_rollups=True, stdout=io.StringIO())
+        timeline = self.client.get(url).json()['timeline']
+        self.assertEqual(timeline[-1]['totals'], {str(choice_b.id): 1})
+
+    def test_admin_reads_shard_counts(self):
+        """The question and choice changelists show the shard counts, and the Vote changelist is hidden."""
+        admin = get_user_model().objects.create_superuser(username="admin", password="@yoyo007")
+        self.client.force_login(admin)
+        question, choice = self.questions[0], self.choices[0][0]
+        self.vote(question, choice)
+        response = self.client.get(reverse('admin:polls_question_changelist'))
+        self.assertContains(response, '<td class="field-total_votes">1</td>', html=True)
+        response = self.client.get(reverse('admin:polls_choice_changelist'))
+        self.assertContains(response, '<td class="field-votes">1</td>', html=True)
+        self.assertEqual(self.client.get(reverse('admin:polls_vote_changelist')).status_code, 403)
+
+    def test_delete_choice_drops_votes(self):
+        """Deleting a choice deletes its shard votes and tally."""
+        question, choice = self.questions[0], self.choices[0][0]
+        self.vote(question, choice)
+        choice.delete()
+        alias = shard_for(question.id)
+        self.assertFalse(ShardVote.objects.using(alias).exists())
+        self.assertFalse(ShardTally.objects.using(alias).filter(pk=choice.id).exists())
+        self.assertFalse(ShardRollup.objects.using(alias).exists())
+
+
+@override_settings(POLLS_VOTE_SHARDS=SHARDS)
+class ShardedCommandTests(SimpleTestCase):
+    """Tests of the commands that only know the default database's votes."""
+
+    def test_transfer_commands_refuse_shards(self):
+        """Export, import and seed data stop before touching the database."""
+        for name, args in (('exportpolls', []), ('importpolls', ['polls.jsonl']), ('seedpolls', [])):
+            with self.subTest(name), self.assertRaises(CommandError):
+                call_command(name, *args, stderr=io.StringIO())
+
+    def test_write_behind_refuses_shards(self):
+        """A leftover write-behind buffer is kept instead of being flushed into the default database."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        buffer = VoteBuffer(Path(directory) / 'votes.jsonl', max_size=100, interval=3600)
+        (Path(directory) / 'votes.jsonl').write_text('{"user": 1, "question": 1, "choice": 1, "at": 0}\n')
+        with self.assertRaises(ImproperlyConfigured):
+            buffer.flush()
+        self.assertTrue((Path(directory) / 'votes.flushing').exists())
@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from polls.models import Choice, Question, Vote
+from polls.tests.utils import create_question
+
+
+class TransferTests(TestCase):
+    """Tests of the exportpolls and importpolls commands."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.question = create_question(question_text='Past, "quoted" Question.', days=-5)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.choice_b = Choice.objects.create(question=self.question, choice_text='choice_b')
+        self.question.update_question_vote(self.user, self.choice_b)
+        self.question.refresh_from_db()
+
+    def snapshot(self):
+        """Return every exported row."""
+        return (
+            list(Question.objects.order_by('id').values()),
+            list(Choice.objects.order_by('id').values()),
+            list(Vote.objects.order_by('id').values()),
+        )
+
+    def round_trip(self, output, data_format):
+        """Export, empty the tables, import and check nothing changed."""
+        expected = self.snapshot()
+        call_command('exportpolls', format=data_format, output=output, stderr=io.StringIO())
+        Question.objects.all().delete()
+        call_command('importpolls', output, batch_size=1, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_jsonl_round_trip(self):
+        """Test a JSONL export imports back to the same rows"""
+        self.round_trip(os.path.join(self.directory.name, 'polls.jsonl'), 'jsonl')
+
+    def test_csv_round_trip(self):
+        """Test a CSV export imports back to the same rows, with null dates"""
+        create_question(question_text='No votes.', days=-1)
+        self.round_trip(self.directory.name, 'csv')
+
+    def test_import_batches(self):
+        """Test rows are inserted with one query per batch"""
+        path = os.path.join(self.directory.name, 'polls.jsonl')
+        call_command('exportpolls', output=path, stderr=io.StringIO())
+        Question.objects.all().delete()
+        stdout = io.StringIO()
+        # per model: one INSERT in its own savepoint
+        with self.assertNumQueries(12):
+            call_command('importpolls', path, batch_size=1000, stdout=stdout, stderr=io.StringIO())
+        self.assertIn('1 questions, 2 choices, 1 votes, 1 rollups', stdout.getvalue())
+
+    def test_conflicts(self):
+        """Test importing existing ids fails unless conflicts are ignored"""
+        path = os.path.join(self.directory.name, 'polls.jsonl')
+        call_command('exportpolls', output=path, stderr=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('importpolls', path, stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('importpolls', path, ignore_conflicts=True, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_invalid_lines(self):
+        """Test a bad JSONL line stops the import with its line number"""
+        path = os.path.join(self.directory.name, 'polls.jsonl')
+        call_command('exportpolls', output=path, stderr=io.StringIO())
+        with open(path) as stream:
+            lines = stream.readlines()
+        record = json.loads(lines[1])
+        bad_lines = {
+            'unknown field': {**record, 'color': 'red'},
+            'missing field': {key: value for key, value in record.items() if key != 'choice_text'},
+            'bad value': {**record, 'votes': 'many'},
+            'unknown model': {**record, 'model': 'ballot'},
+        }
+        Question.objects.all().delete()
+        for error, bad_record in bad_lines.items():
+            with self.subTest(error):
+                with open(path, 'w') as stream:
+                    stream.writelines([lines[0], json.dumps(bad_record) + '\n', *lines[2:]])
+                with self.assertRaisesMessage(CommandError, 'line 2: '):
+                    call_command('importpolls', path, stdout=io.StringIO(), stderr=io.StringIO())
+        with open(path, 'w') as stream:
+            stream.writelines([lines[0], '[1, 2]\n'])
+        with self.assertRaisesMessage(CommandError, 'line 2: not a JSON object'):
+            call_command('importpolls', path, stdout=io.StringIO(), stderr=io.StringIO())
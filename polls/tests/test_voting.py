@@ -1,8 +1,10 @@
 import datetime
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.test import TestCase
 from django.utils import timezone
-from polls.models import Question, Choice
+from polls.ballots import UserBallot
+from polls.models import Question, Choice, Vote
 
 
 def create_user(username, password, first_name='anonymous', last_name='no surnames', email='foo@boo.com'):
@@ -95,6 +97,13 @@ class VotingTests(TestCase):
         self.assertEqual(self.choice_a.votes, 1)
         self.assertEqual(self.choice_b.votes, 0)
 
+    def test_same_choice_keeps_version(self):
+        """Test voting the same choice again does not change the results version"""
+        create_vote(self.question, self.choice_a, self.user)
+        stamp = Question.objects.values_list('version', 'results_modified').get(pk=self.question.pk)
+        create_vote(self.question, self.choice_a, self.user)
+        self.assertEqual(Question.objects.values_list('version', 'results_modified').get(pk=self.question.pk), stamp)
+
     def test_another_user_vote(self):
         """Test when another user vote the same question"""
         create_vote(self.question, self.choice_a, self.user)
@@ -110,3 +119,65 @@ class VotingTests(TestCase):
         self.update_choice_vote()
         self.assertEqual(self.choice_a.votes, 2)
         self.assertEqual(self.choice_b.votes, 0)
+
+    def test_vote_updates_stored_tallies(self):
+        """Test the stored choice votes are updated without a recount"""
+        create_vote(self.question, self.choice_a, self.user)
+        create_vote(self.question, self.choice_b, self.another_user)
+        create_vote(self.question, self.choice_b, self.user)
+        self.choice_a.refresh_from_db()
+        self.choice_b.refresh_from_db()
+        self.assertEqual(self.choice_a.votes, 0)
+        self.assertEqual(self.choice_b.votes, 2)
+
+    def test_vote_query_count_is_constant(self):
+        """Test switching a vote does not depend on the number of existing votes"""
+        for i in range(10):
+            create_vote(self.question, self.choice_a, create_user(f"user{i}", "password"))
+        create_vote(self.question, self.choice_a, self.user)
+        with self.assertNumQueries(9):
+            create_vote(self.question, self.choice_b, self.user)
+
+    def test_upsert_switches_existing_vote(self):
+        """Test upsert keeps one vote per user and question"""
+        Vote.objects.upsert(question=self.question, choice=self.choice_a, user=self.user)
+        Vote.objects.upsert(question=self.question, choice=self.choice_b, user=self.user)
+        votes = Vote.objects.filter(question=self.question, user=self.user)
+        self.assertEqual(votes.count(), 1)
+        self.assertEqual(votes.get().choice, self.choice_b)
+
+    def test_duplicate_vote_is_rejected(self):
+        """Test the database rejects a second vote row for the same user and question"""
+        create_vote(self.question, self.choice_a, self.user)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(question=self.question, choice=self.choice_b, user=self.user)
+
+
+class UserBallotTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user("Kitty", "@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.other_question = create_question(question_text='Other Question.', days=-5)
+        self.choice_a = create_choice(self.question, 'choice_a')
+        self.choice_b = create_choice(self.question, 'choice_b')
+        create_vote(self.question, self.choice_a, self.user)
+
+    def test_lookups_after_load_run_no_queries(self):
+        """Test the ballot reads the user's votes once"""
+        ballot = UserBallot(self.user)
+        with self.assertNumQueries(1):
+            ballot.load([self.question.id, self.other_question.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(ballot.get(self.question.id), self.choice_a.id)
+            self.assertIsNone(ballot.get(self.other_question.id))
+
+    def test_record_updates_ballot(self):
+        """Test a recorded vote replaces the loaded one"""
+        ballot = UserBallot(self.user)
+        ballot.load_all()
+        ballot.record(self.question.id, self.choice_b.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(ballot.get(self.question.id), self.choice_b.id)
+            self.assertEqual(ballot.status(self.question.id, [self.choice_a, self.choice_b]),
+                             "Kitty have voted for choice_b")
@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from polls.models import Choice, Question, Vote
+from polls.tests.utils import create_question
+from polls.writebehind import VoteBuffer
+
+
+class WriteBehindTests(TestCase):
+    """Tests of the write-behind vote buffer."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.buffer = VoteBuffer(os.path.join(self.directory.name, 'votes.jsonl'), max_size=100, interval=60)
+        self.addCleanup(self.buffer.flush)
+        self.user = get_user_model().objects.create_user(username="Kitty", password="@yoyo007")
+        self.another_user = get_user_model().objects.create_user(username="Dicky", password="@yoyo007")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice_a = Choice.objects.create(question=self.question, choice_text='choice_a')
+        self.choice_b = Choice.objects.create(question=self.question, choice_text='choice_b')
+
+    def test_votes_are_written_on_flush(self):
+        """Test buffered votes are only in the database after a flush"""
+        self.buffer.append(self.user.id, self.question.id, self.choice_a.id)
+        self.assertEqual(self.buffer.pending_choice(self.user.id, self.question.id), self.choice_a.id)
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.choice_a)
+        self.assertIsNone(self.buffer.pending_choice(self.user.id, self.question.id))
+
+    def test_flush_coalesces_votes_and_updates_tallies(self):
+        """Test the last vote of each user wins and the tallies match"""
+        self.question.update_question_vote(self.another_user, self.choice_a)
+        self.buffer.append(self.user.id, self.question.id, self.choice_a.id)
+        self.buffer.append(self.user.id, self.question.id, self.choice_b.id)
+        self.buffer.append(self.another_user.id, self.question.id, self.choice_b.id)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.choice_a.refresh_from_db()
+        self.choice_b.refresh_from_db()
+        self.assertEqual(self.choice_a.votes, 0)
+        self.assertEqual(self.choice_b.votes, 2)
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_full_buffer_is_flushed(self):
+        """Test the buffer flushes when it reaches its size"""
+        self.buffer.max_size = 2
+        self.buffer.append(self.user.id, self.question.id, self.choice_a.id)
+        self.buffer.append(self.another_user.id, self.question.id, self.choice_a.id)
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_truncated_line_is_rejected(self):
+        """Test a line cut short by a crash is set aside and the other votes are flushed"""
+        self.buffer.append(self.user.id, self.question.id, self.choice_a.id)
+        with open(self.buffer.path, 'a') as f:
+            f.write('{"user": %d, "question": %d, "cho' % (self.another_user.id, self.question.id))
+        with self.assertLogs('polls.writebehind', 'WARNING'):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get().user, self.user)
+        self.assertFalse(self.buffer.path.with_suffix('.flushing').exists())
+        rejected = self.buffer.path.with_suffix('.rejected').read_text()
+        self.assertTrue(rejected.startswith('{"user": %d' % self.another_user.id))
+        self.buffer.append(self.another_user.id, self.question.id, self.choice_b.id)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_repeated_vote_keeps_version(self):
+        """Test flushing a vote for the user's current choice does not change the results version"""
+        self.question.update_question_vote(self.user, self.choice_a)
+        version = Question.objects.get(pk=self.question.pk).version
+        self.buffer.append(self.user.id, self.question.id, self.choice_a.id)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).version, version)
+        self.buffer.append(self.user.id, self.question.id, self.choice_b.id)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertGreater(Question.objects.get(pk=self.question.pk).version, version)
@@ -0,0 +1,24 @@
+import datetime
+
+from django.utils import timezone
+
+from polls.models import Question
+
+
+def create_question(question_text, days):
+    """Create a question.
+
+    with the given `question_text` and published the
+    given number of `days` offset to now (negative for questions published
+    in the past, positive for questions that have yet to be published).
+
+    Returns:
+        Question : a new question
+    """
+    pub = timezone.now() + datetime.timedelta(days=days)
+    end = pub+datetime.timedelta(days=365)
+    return Question.objects.create(
+        question_text=question_text,
+        pub_date=pub,
+        end_date=end
+    )
@@ -0,0 +1,209 @@
+"""Streaming export and import of questions, choices, votes and vote rollups.
+
+Rows are read with chunked .iterator() queries and written one at a time,
+and imported in bulk_create batches of one transaction each, so memory use
+stays the same whatever the size of the data. Ids are kept, so votes still
+point to the same users: import into a database that has those users.
+"""
+import csv
+import datetime
+import json
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import Choice, Question, Vote, VoteRollup
+
+# Exported in this order so foreign keys always point to imported rows.
+MODELS = {
+    'question': (Question, ['id', 'question_text', 'pub_date', 'end_date', 'version', 'results_modified']),
+    'choice': (Choice, ['id', 'question_id', 'choice_text', 'votes']),
+    'vote': (Vote, ['id', 'question_id', 'choice_id', 'user_id', 'created']),
+    'rollup': (VoteRollup, ['id', 'question_id', 'choice_id', 'hour', 'votes']),
+}
+
+
+def csv_path(directory, name):
+    """Return the path of the CSV file of the name model in directory."""
+    return os.path.join(directory, f'{name}s.csv')
+
+
+class Progress:
+    """Count the transferred rows of each model and report the rate.
+
+    Args:
+        write : called with each progress line
+        every : rows between two progress lines
+    """
+
+    def __init__(self, write, every=100000):
+        self.write = write
+        self.every = every
+        self.counts = dict.fromkeys(MODELS, 0)
+        self.start = time.perf_counter()
+
+    def rate(self):
+        """Return the rows per second since the start."""
+        elapsed = time.perf_counter() - self.start
+        return sum(self.counts.values()) / elapsed if elapsed else 0.0
+
+    def add(self, name, rows=1):
+        """Count rows of the name model."""
+        before = self.counts[name]
+        self.counts[name] += rows
+        if before // self.every != self.counts[name] // self.every:
+            self.write(f'{name}: {self.counts[name]} rows ({self.rate():.0f} rows/sec)')
+
+    def summary(self):
+        """Return the totals as one line."""
+        totals = ', '.join(f'{count} {name}s' for name, count in self.counts.items())
+        return f'{totals} in {time.perf_counter() - self.start:.1f}s ({self.rate():.0f} rows/sec)'
+
+
+def iter_rows(name, chunk_size, using=DEFAULT_DB_ALIAS):
+    """Yield the value tuples of every row of the name model, in id order."""
+    model, fields = MODELS[name]
+    return model.objects.using(using).order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def dump_value(value):
+    """Return value as a JSON or CSV friendly value."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def write_jsonl(stream, progress, chunk_size=2000, using=DEFAULT_DB_ALIAS):
+    """Write every row to stream as one JSON object per line, with its 'model'."""
+    for name, (model, fields) in MODELS.items():
+        for row in iter_rows(name, chunk_size, using):
+            record = {'model': name, **{field: dump_value(value) for field, value in zip(fields, row)}}
+            stream.write(json.dumps(record) + '\n')
+            progress.add(name)
+
+
+def write_csv(directory, progress, chunk_size=2000, using=DEFAULT_DB_ALIAS):
+    """Write the rows of each model to <model>s.csv in directory."""
+    os.makedirs(directory, exist_ok=True)
+    for name, (model, fields) in MODELS.items():
+        with open(csv_path(directory, name), 'w', newline='') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(fields)
+            for row in iter_rows(name, chunk_size, using):
+                writer.writerow(['' if value is None else dump_value(value) for value in row])
+                progress.add(name)
+
+
+class Loader:
+    """Insert rows with bulk_create, one batch and one transaction at a time.
+
+    Rows must come grouped by model, in MODELS order.
+
+    Args:
+        progress : the Progress to count inserted rows
+        batch_size : rows per bulk_create
+        ignore_conflicts : skip rows whose id already exists
+        using : the database alias
+    """
+
+    def __init__(self, progress, batch_size=5000, ignore_conflicts=False, using=DEFAULT_DB_ALIAS):
+        self.progress = progress
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.using = using
+        self.name = None
+        self.batch = []
+
+    def add(self, name, values):
+        """Queue one row of the name model.
+
+        Args:
+            name : 'question', 'choice', 'vote' or 'rollup'
+            values : field name -> value, as strings or JSON values
+
+        Raises:
+            ValueError : the model is unknown, or the fields are not the exported ones
+        """
+        if name not in MODELS:
+            raise ValueError(f'Unknown model: {name!r}')
+        model, fields = MODELS[name]
+        unknown, missing = set(values) - set(fields), set(fields) - set(values)
+        if unknown:
+            raise ValueError(f'Unknown {name} fields: {", ".join(sorted(unknown))}')
+        if missing:
+            raise ValueError(f'Missing {name} fields: {", ".join(sorted(missing))}')
+        if name != self.name:
+            self.flush()
+            self.name = name
+        self.batch.append(model(**{field: self.parse(model, field, value) for field, value in values.items()}))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    @staticmethod
+    def parse(model, field_name, value):
+        """Return value converted to the Python type of the field, or raise ValueError."""
+        field = model._meta.get_field(field_name)
+        if value == '' and field.null:
+            return None
+        try:
+            return field.to_python(value)
+        except ValidationError as error:
+            raise ValueError(f'{field_name}: {" ".join(error.messages)}') from error
+
+    def flush(self):
+        """Insert the queued rows."""
+        if not self.batch:
+            return
+        model, _ = MODELS[self.name]
+        with transaction.atomic(using=self.using):
+            model.objects.using(self.using).bulk_create(self.batch, ignore_conflicts=self.ignore_conflicts)
+        self.progress.add(self.name, len(self.batch))
+        self.batch = []
+
+    def close(self):
+        """Insert the last rows and move the id sequences past the imported ids."""
+        self.flush()
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), [model for model, _ in MODELS.values()])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+
+def read_jsonl(stream, loader):
+    """Load every line of a write_jsonl stream.
+
+    Raises:
+        ValueError : a line is not a valid row, with its line number
+    """
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('not a JSON object')
+            loader.add(record.pop('model', None), record)
+        except ValueError as error:
+            raise ValueError(f'line {number}: {error}') from error
+    loader.close()
+
+
+def read_csv(directory, loader):
+    """Load the <model>s.csv files of a write_csv directory, skipping missing ones."""
+    for name in MODELS:
+        path = csv_path(directory, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='') as stream:
+            reader = csv.DictReader(stream)
+            for values in reader:
+                try:
+                    loader.add(name, values)
+                except ValueError as error:
+                    raise ValueError(f'{os.path.basename(path)} line {reader.line_num}: {error}') from error
+    loader.close()
@@ -1,19 +1,31 @@
 """URLs for polls app."""
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
 
 app_name = 'polls'
+# The async views of polls.async_views are served instead of polls.views when
+# POLLS_ASYNC_VIEWS is on; the stream and the JSON API are the same for both.
+views_mod = async_views if settings.POLLS_ASYNC_VIEWS else views
 urlpatterns = [
     # ex: /polls/
-    path('', views.IndexView.as_view(), name='index'),
+    path('', views_mod.index, name='index'),
     # ex: /polls/5/
     # path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:question_id>/', views.detail, name='detail'),
+    path('<int:question_id>/', views_mod.detail, name='detail'),
     # ex: /polls/5/results/
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
+    path('<int:pk>/results/', views_mod.results, name='results'),
+    # ex: /polls/5/results/stream/
+    path('<int:pk>/results/stream/', views.results_stream, name='results_stream'),
     # ex: /polls/5/vote/
-    path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('<int:question_id>/vote/', views_mod.vote, name='vote'),
+    # ex: /polls/5/results.json
+    path('<int:pk>/results.json', api.question_results, name='results_json'),
+    # ex: /polls/results.json?ids=1,2,3
+    path('results.json', api.bulk_results, name='bulk_results_json'),
+    # ex: /polls/5/timeline.json
+    path('<int:pk>/timeline.json', api.question_timeline, name='timeline_json'),
 ]
 
 # Amend URL conf
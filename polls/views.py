@@ -1,25 +1,85 @@
 """Views for polls app."""
 import logging
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
 
+from .ballots import get_ballot
+from .cache import get_results_table
+from .live import STREAM_RETRY_AFTER, open_stream
 from .models import Choice, Question
+from .pagination import paginate_questions
+from .shards import cast_vote, is_sharded
+from .writebehind import get_vote_buffer
 
-# Why can't use setting.py?
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] %(levelname)-4s %(message)s',
-    datefmt='%d/%b/%Y %H:%M:%S',
-)
 logger = logging.getLogger(__name__)
 
 
+def get_index_page(request):
+    """Return the requested page of published questions, newest first.
+
+    Each question is annotated with its status and the id of the choice
+    the user voted for (voted_choice_id).
+
+    Returns:
+        KeysetPage : the page of questions
+    """
+    now = timezone.now()
+    page = paginate_questions(
+        Question.objects.with_status(now).filter(pub_date__lte=now),
+        settings.POLLS_INDEX_PAGE_SIZE,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    ballot = get_ballot(request)
+    ballot.load([question.id for question in page.object_list])
+    for question in page.object_list:
+        question.voted_choice_id = ballot.get(question.id)
+    return page
+
+
+def get_detail_context(request, question, **extra):
+    """Return the context of the detail page of question.
+
+    Args:
+        question : the question to vote on
+        extra : more context, e.g. error_message
+
+    Returns:
+        dict : the context for polls/detail.html
+    """
+    ballot = get_ballot(request)
+    choices = list(question.choice_set.all())
+    return {
+        'question': question,
+        'choices': choices,
+        'vote_status': ballot.status(question.id, choices),
+        'current_choice_id': ballot.get(question.id),
+        **extra,
+    }
+
+
+def save_vote(request, question, choice):
+    """Record the vote of request.user, in the database, its vote shard or the write-behind buffer."""
+    if is_sharded():
+        cast_vote(question, choice, request.user)
+    elif settings.POLLS_VOTE_WRITE_BEHIND:
+        get_vote_buffer().append(request.user.id, question.id, choice.id)
+    else:
+        question.update_question_vote(request.user, choice)
+    get_ballot(request).record(question.id, choice.id)
+    logger.info('user: %s - voted for poll#%s', request.user.username, question.id, extra={
+        'question_id': question.id,
+        'sample': True,
+    })
+
+
 class IndexView(generic.ListView):
     """ListView for index page contain question queryset."""
 
@@ -27,10 +87,18 @@ class IndexView(generic.ListView):
     context_object_name = 'latest_question_list'
 
     def get_queryset(self):
-        """Return the all published questions."""
-        return Question.objects.filter(
-            pub_date__lte=timezone.now()
-        ).order_by('-pub_date')[:]
+        """Return a page of the published questions with their status, newest first."""
+        self.page = get_index_page(self.request)
+        return self.page.object_list
+
+    def get_context_data(self, **kwargs):
+        """Add the page cursors to the context."""
+        context = super().get_context_data(**kwargs)
+        context['page'] = self.page
+        return context
+
+
+index = IndexView.as_view()
 
 
 @login_required
@@ -47,18 +115,12 @@ def detail(request, question_id):
         HttpResponse : the question detail page
         or index page with error messages
     """
-    question = get_object_or_404(Question, pk=question_id)
-    status = question.voted_status(request.user)
-    current_choice = question.get_current_choice(request.user)
-    if not question.can_vote():
+    question = get_object_or_404(Question.objects.with_status(), pk=question_id)
+    if question.status != Question.OPEN:
         msg = f"Poll: \"{question.question_text}\" is not longer publish."
         messages.error(request, msg)
         return HttpResponseRedirect(reverse('polls:index'))
-    return render(request, 'polls/detail.html', {
-        'question': question,
-        'vote_status': status,
-        'current_choice': current_choice
-    })
+    return render(request, 'polls/detail.html', get_detail_context(request, question))
 
 
 class ResultsView(generic.DetailView):
@@ -67,6 +129,38 @@ class ResultsView(generic.DetailView):
     model = Question
     template_name = 'polls/results.html'
 
+    def get_context_data(self, **kwargs):
+        """Add the cached results table and the live option to the context."""
+        context = super().get_context_data(**kwargs)
+        context['results_table'] = get_results_table(self.object)
+        context['live'] = 'live' in self.request.GET
+        return context
+
+
+results = ResultsView.as_view()
+
+
+def results_stream(request, pk):
+    """View streaming the results of that pk question as Server-Sent Events.
+
+    Args:
+        pk (int): question's id
+
+    Returns:
+        StreamingHttpResponse : text/event-stream of choice count changes
+        or HttpResponse : 503 when this process streams POLLS_STREAM_MAX_CLIENTS clients
+    """
+    get_object_or_404(Question, pk=pk)
+    stream = open_stream(pk)
+    if stream is None:
+        response = HttpResponse('Too many live results streams, retry later.', status=503)
+        response['Retry-After'] = STREAM_RETRY_AFTER
+        return response
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @login_required
 def vote(request, question_id):
@@ -83,17 +177,10 @@ def vote(request, question_id):
         selected_choice = question.choice_set.get(pk=request.POST['choice'])
     except (KeyError, Choice.DoesNotExist):
         # Redisplay the question voting form.
-        return render(request, 'polls/detail.html', {
-            'question': question,
-            'error_message': "You didn't select a choice.",
-            'vote_status': question.voted_status(request.user),
-        })
+        return render(request, 'polls/detail.html', get_detail_context(
+            request, question, error_message="You didn't select a choice."))
     else:
         # check & update/add
-        question.update_question_vote(request.user, selected_choice)
-        logger.info('user: {user} - voted for poll#{poll_id}'.format(
-            user=request.user.username,
-            poll_id=question.id
-        ))
+        save_vote(request, question, selected_choice)
         url = reverse('polls:results', args=(question.id,))
         return HttpResponseRedirect(url)
@@ -0,0 +1,222 @@
+"""Optional write-behind buffer for votes.
+
+When settings.POLLS_VOTE_WRITE_BEHIND is on, the vote view appends each
+accepted vote to a local append-only file instead of writing the database.
+The buffer is flushed when it reaches POLLS_VOTE_BUFFER_SIZE votes, every
+POLLS_VOTE_BUFFER_INTERVAL seconds, at interpreter shutdown and by the
+flushvotes management command. A flush coalesces the votes per
+(user, question), keeping the last one, and applies them with bulk_create,
+bulk_update, one tally update and one rollup update in a single
+transaction. Buffered votes are counted in the rollup hour of the flush.
+
+Read-your-own-write: the worker process that accepted a vote shows it to the
+voter through UserBallot right away. Other workers, the results page and the
+choice tallies show it after the next flush. Applying a vote sets the user's
+vote to a choice, so replaying a buffer after a crash is safe. A line that
+cannot be read, such as one cut short by a crash, is moved to a .rejected
+file next to the buffer and logged instead of blocking every later flush.
+
+Votes are not buffered with vote shards, and a buffer left from before the
+shards were set up is refused rather than flushed into the default database.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Choice, Question, Vote, VoteRollup
+from .shards import is_sharded
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def apply_votes(entries):
+    """Write buffered votes to the database in one transaction.
+
+    Args:
+        entries : iterable of (user_id, question_id, choice_id), oldest first
+
+    Returns:
+        int : the number of (user, question) votes applied
+
+    Raises:
+        ImproperlyConfigured : if the votes are stored in vote shards
+    """
+    if is_sharded():
+        raise ImproperlyConfigured('Buffered votes cannot be applied to vote shards; set SQLITE_VOTE_SHARDS=0 '
+                                   'and run flushvotes first.')
+    latest = {}
+    for user_id, question_id, choice_id in entries:
+        latest[(user_id, question_id)] = choice_id
+    if not latest:
+        return 0
+    with transaction.atomic():
+        valid = set(Choice.objects.filter(pk__in=set(latest.values())).values_list('id', 'question_id'))
+        latest = {key: choice_id for key, choice_id in latest.items() if (choice_id, key[1]) in valid}
+        existing = {
+            (vote.user_id, vote.question_id): vote
+            for vote in Vote.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in latest},
+                question_id__in={question_id for _, question_id in latest},
+            )
+        }
+        created, changed, deltas, changed_questions = [], [], {}, set()
+        for (user_id, question_id), choice_id in latest.items():
+            vote = existing.get((user_id, question_id))
+            if vote is None:
+                created.append(Vote(user_id=user_id, question_id=question_id, choice_id=choice_id))
+            elif vote.choice_id != choice_id:
+                old_key = (question_id, vote.choice_id)
+                deltas[old_key] = deltas.get(old_key, 0) - 1
+                vote.choice_id = choice_id
+                changed.append(vote)
+            else:
+                continue
+            changed_questions.add(question_id)
+            deltas[(question_id, choice_id)] = deltas.get((question_id, choice_id), 0) + 1
+        Vote.objects.bulk_create(created, batch_size=500)
+        Vote.objects.bulk_update(changed, ['choice'], batch_size=500)
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if deltas:
+            Choice.objects.filter(pk__in=[choice_id for _, choice_id in deltas]).update(votes=F('votes') + Case(
+                *[When(pk=choice_id, then=Value(delta)) for (_, choice_id), delta in deltas.items()],
+                default=Value(0), output_field=IntegerField(),
+            ))
+            VoteRollup.objects.add(deltas)
+        if changed_questions:
+            Question.objects.filter(pk__in=changed_questions).bump_version()
+    return len(created) + len(changed)
+
+
+class VoteBuffer:
+    """Durable local buffer of votes waiting to be written to the database.
+
+    Args:
+        path : the append-only buffer file
+        max_size : flush when this many votes are buffered by this process
+        interval : flush at most this many seconds after a vote is buffered
+    """
+
+    def __init__(self, path, max_size, interval):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.interval = interval
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._timer = None
+
+    @contextmanager
+    def _file_lock(self):
+        """Lock the buffer against other processes."""
+        with open(self.path.with_suffix('.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, user_id, question_id, choice_id):
+        """Buffer a vote and flush if the buffer is full."""
+        line = json.dumps({'user': user_id, 'question': question_id, 'choice': choice_id, 'at': time.time()})
+        with self._lock:
+            with self._file_lock(), open(self.path, 'a') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending[(user_id, question_id)] = choice_id
+            full = len(self._pending) >= self.max_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def pending_choice(self, user_id, question_id):
+        """Return the choice id of a vote buffered by this process, or None."""
+        return self._pending.get((user_id, question_id))
+
+    def flush(self):
+        """Write every buffered vote to the database.
+
+        Returns:
+            int : the number of (user, question) votes applied
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            with self._file_lock():
+                flushing = self.path.with_suffix('.flushing')
+                # A .flushing file left by an interrupted flush is replayed first.
+                if self.path.exists():
+                    with open(self.path) as src, open(flushing, 'a') as dst:
+                        dst.write(src.read())
+                    self.path.unlink()
+                if not flushing.exists():
+                    self._pending.clear()
+                    return 0
+                entries, rejected = [], []
+                with open(flushing) as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                            entries.append((record['user'], record['question'], record['choice']))
+                        except (ValueError, KeyError, TypeError):
+                            rejected.append(line.rstrip('\n') + '\n')
+                applied = apply_votes(entries)
+                if rejected:
+                    self._reject(rejected)
+                flushing.unlink()
+            self._pending.clear()
+        return applied
+
+    def _reject(self, lines):
+        """Keep unreadable buffer lines in the .rejected file for inspection."""
+        rejected = self.path.with_suffix('.rejected')
+        with open(rejected, 'a') as f:
+            f.writelines(lines)
+        logger.warning('Skipped %d unreadable vote buffer lines, kept in %s', len(lines), rejected)
+
+    def _flush_on_timer(self):
+        """Flush from the timer thread and release its database connection."""
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_vote_buffer():
+    """Return the vote buffer of this process, registering its shutdown flush."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VoteBuffer(
+                settings.POLLS_VOTE_BUFFER_PATH,
+                settings.POLLS_VOTE_BUFFER_SIZE,
+                settings.POLLS_VOTE_BUFFER_INTERVAL,
+            )
+            atexit.register(_buffer.flush)
+        return _buffer